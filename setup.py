@@ -18,6 +18,7 @@ setuptools.setup(
     url="https://github.com/pslmodels/Tax-Cruncher",
     packages=setuptools.find_packages(),
     install_requires=["taxcalc", "paramtools"],
+    extras_require={"arrow": ["pyarrow"]},
     include_package_data=True,
     classifiers=[
         "Programming Language :: Python :: 3",
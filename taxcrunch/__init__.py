@@ -1,5 +1,47 @@
-from taxcrunch.cruncher import *
-from taxcrunch.multi_cruncher import *
+import importlib
 
 name = "taxcrunch"
 __version__ = "0.6.0"
+
+# Submodules and their public names are imported on first attribute access,
+# so that "import taxcrunch" does not load Tax-Calculator, ParamTools or
+# pandas until they are needed.
+_SUBMODULES = [
+    "columnar",
+    "cruncher",
+    "multi_cruncher",
+    "reforms",
+    "result_cache",
+    "translator",
+]
+
+_PUBLIC_NAMES = {
+    "Cruncher": "cruncher",
+    "CruncherParams": "cruncher",
+    "CruncherResults": "cruncher",
+    "MTR_OPTIONS": "cruncher",
+    "new_params": "cruncher",
+    "taxsim_params": "cruncher",
+    "Batch": "multi_cruncher",
+    "BatchParams": "multi_cruncher",
+    "FINITE_DIFF": "multi_cruncher",
+}
+
+__all__ = list(_PUBLIC_NAMES)
+
+
+def __getattr__(attr):
+    if attr in _SUBMODULES:
+        return importlib.import_module("." + attr, __name__)
+    if attr in _PUBLIC_NAMES:
+        module = importlib.import_module("." + _PUBLIC_NAMES[attr], __name__)
+        value = getattr(module, attr)
+        globals()[attr] = value
+        return value
+    raise AttributeError(
+        "module {!r} has no attribute {!r}".format(__name__, attr)
+    )
+
+
+def __dir__():
+    return sorted(list(globals()) + _SUBMODULES + __all__)
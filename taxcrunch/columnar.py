@@ -0,0 +1,274 @@
+"""
+Parquet, Feather and Arrow IPC input and output for Batch. Input files have
+the 28 TAXSIM-style columns of the csv input format in the same order; their
+names do not matter, and any further columns are not read. Requires pyarrow.
+"""
+
+import os
+import tempfile
+
+# file extensions and the format they are read and written in. Feather files
+# (version 2) are Arrow IPC files.
+FORMATS = {
+    ".parquet": "parquet",
+    ".pq": "parquet",
+    ".feather": "ipc",
+    ".arrow": "ipc",
+    ".ipc": "ipc",
+}
+
+# number of TAXSIM-style input columns
+INPUT_COLUMNS = 28
+
+
+def _pyarrow():
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raise ImportError(
+            "Parquet, Feather and Arrow files require pyarrow"
+        ) from None
+    return pa
+
+
+def file_format(path):
+    """
+    Returns "parquet" or "ipc" for a columnar file path and None otherwise
+    """
+    if not isinstance(path, (str, os.PathLike)):
+        return None
+    return FORMATS.get(os.path.splitext(str(path))[1].lower())
+
+
+def input_schema():
+    """
+    Returns the Arrow schema of the input columns, named after the parameters
+        in defaults_batch.json, with int64 for integer parameters and float64
+        otherwise
+    """
+    pa = _pyarrow()
+    from taxcrunch.multi_cruncher import input_rules
+
+    return pa.schema(
+        [
+            (name, pa.int64() if kind in ("int", "bool") else pa.float64())
+            for name, kind, _, _ in input_rules()
+        ]
+    )
+
+
+def to_frame(table):
+    """
+    Converts the first 28 columns of an Arrow table or record batch to a
+        Pandas dataframe with the columns labeled 0-27, like a csv input file
+    """
+    columns = table.schema.names[:INPUT_COLUMNS]
+    ivar = table.select(columns).to_pandas()
+    ivar.columns = range(len(columns))
+    return ivar
+
+
+def iter_inputs(path, chunksize):
+    """
+    Reads the input columns of a columnar file in chunks of rows
+
+    Returns:
+        a generator of Pandas dataframes with columns labeled 0-27
+    """
+    pa = _pyarrow()
+    if file_format(path) == "parquet":
+        import pyarrow.parquet as pq
+
+        f = pq.ParquetFile(path)
+        columns = f.schema_arrow.names[:INPUT_COLUMNS]
+        for batch in f.iter_batches(batch_size=chunksize, columns=columns):
+            yield to_frame(batch)
+    else:
+        # IPC files are memory mapped and read one record batch at a time,
+        # since compressed batches are decompressed when they are read
+        with pa.memory_map(str(path)) as source:
+            reader = pa.ipc.open_file(source)
+            pending = []
+            rows = 0
+            for i in range(reader.num_record_batches):
+                batch = reader.get_batch(i)
+                while batch.num_rows:
+                    piece = batch.slice(0, chunksize - rows)
+                    batch = batch.slice(piece.num_rows)
+                    pending.append(piece)
+                    rows += piece.num_rows
+                    if rows == chunksize:
+                        yield to_frame(pa.Table.from_batches(pending))
+                        pending = []
+                        rows = 0
+            if pending:
+                yield to_frame(pa.Table.from_batches(pending))
+
+
+def read_inputs(path):
+    """
+    Reads the input columns of a columnar file
+
+    Returns:
+        ivar: a Pandas dataframe with columns labeled 0-27
+    """
+    pa = _pyarrow()
+    if file_format(path) == "parquet":
+        import pyarrow.parquet as pq
+
+        columns = pq.read_schema(path).names[:INPUT_COLUMNS]
+        return to_frame(pq.read_table(path, columns=columns))
+    with pa.memory_map(str(path)) as source:
+        return to_frame(pa.ipc.open_file(source).read_all())
+
+
+def iter_batches(path):
+    """
+    Reads a Parquet or Arrow IPC file one record batch at a time
+
+    Returns:
+        a generator of Arrow record batches
+    """
+    pa = _pyarrow()
+    if file_format(path) == "parquet":
+        import pyarrow.parquet as pq
+
+        with pq.ParquetFile(path) as f:
+            yield from f.iter_batches()
+    else:
+        with pa.memory_map(str(path)) as source:
+            reader = pa.ipc.open_file(source)
+            for i in range(reader.num_record_batches):
+                yield reader.get_batch(i)
+
+
+def to_arrow(df, schema=None):
+    """
+    Converts a dataframe to an Arrow table column by column from the
+        underlying arrays, without the index
+
+    schema: optional Arrow schema to name and cast the columns with
+    """
+    pa = _pyarrow()
+    arrays = [pa.array(df.iloc[:, i].to_numpy()) for i in range(df.shape[1])]
+    if schema is None:
+        return pa.Table.from_arrays(arrays, names=[str(c) for c in df.columns])
+    arrays = [array.cast(field.type) for array, field in zip(arrays, schema)]
+    return pa.Table.from_arrays(arrays, schema=schema)
+
+
+class TableWriter:
+    """
+    Writes dataframes with the same columns to a Parquet or Arrow IPC file
+    one after the other, e.g. the chunks of Batch.stream(). Every dataframe
+    is written with the types of the file. If one needs wider types, e.g.
+    int32 instead of int16 in a compact table, the rows written so far are
+    rewritten with the wider types.
+
+    Parameters
+    ----------
+    path: file path with one of the extensions in FORMATS
+
+    schema: optional Arrow schema for the file, see to_arrow()
+
+    """
+
+    def __init__(self, path, schema=None):
+        self.format = file_format(path)
+        if self.format is None:
+            raise ValueError(
+                "{} does not have one of the extensions {}".format(
+                    path, list(FORMATS)
+                )
+            )
+        self.path = path
+        self.schema = schema
+        self.rows = 0
+        self._writer = None
+        self._writer_schema = None
+        # file being written: path, or a temporary file that replaces path
+        # on close after the types were widened
+        self._target = path
+
+    def _open(self, target, schema):
+        pa = _pyarrow()
+        if self.format == "parquet":
+            import pyarrow.parquet as pq
+
+            self._writer = pq.ParquetWriter(target, schema)
+        else:
+            self._writer = pa.ipc.new_file(str(target), schema)
+        self._writer_schema = schema
+        self._target = target
+
+    def _widen(self, schema):
+        """
+        Rewrites the rows written so far to a new file with schema
+        """
+        pa = _pyarrow()
+        self._writer.close()
+        written = self._target
+        fd, tmp = tempfile.mkstemp(
+            dir=os.path.dirname(os.path.abspath(str(self.path))),
+            # keeps the extension that tells the format of the file
+            suffix=".tmp" + os.path.splitext(str(self.path))[1],
+        )
+        os.close(fd)
+        self._open(tmp, schema)
+        for batch in iter_batches(written):
+            self._writer.write_table(
+                pa.Table.from_batches([batch]).cast(schema)
+            )
+        if written != self.path:
+            os.remove(written)
+
+    def write(self, df):
+        """
+        Appends the rows of df to the file
+        """
+        table = to_arrow(df, self.schema)
+        if self._writer is None:
+            self._open(self.path, table.schema)
+        elif not table.schema.equals(self._writer_schema):
+            pa = _pyarrow()
+            schema = pa.unify_schemas(
+                [self._writer_schema, table.schema],
+                promote_options="permissive",
+            )
+            if not schema.equals(self._writer_schema):
+                self._widen(schema)
+            table = table.cast(schema)
+        self._writer.write_table(table)
+        self.rows += table.num_rows
+
+    def close(self):
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+            if self._target != self.path:
+                os.replace(self._target, self.path)
+                self._target = self.path
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def write_table(df, path):
+    """
+    Writes a table created by Batch to a Parquet or Arrow IPC file
+    """
+    with TableWriter(path) as writer:
+        writer.write(df)
+
+
+def write_inputs(ivar, path):
+    """
+    Writes TAXSIM-style inputs (e.g. a csv input file read with
+        pd.read_csv(path, header=None)) to a Parquet or Arrow IPC file with
+        named columns and explicit types, see input_schema()
+    """
+    with TableWriter(path, input_schema()) as writer:
+        writer.write(ivar)
@@ -1,10 +1,13 @@
+import copy
 import json
 import os
+from functools import cached_property, lru_cache
 import numpy as np
 import pandas as pd
-import taxcalc as tc
 
-from paramtools import Parameters
+from paramtools import Parameters, ValidationError
+from taxcrunch import reforms, translator
+from taxcrunch.translator import MTR_OPTIONS
 
 CURRENT_PATH = os.path.abspath(os.path.dirname(__file__))
 
@@ -14,6 +17,146 @@ class CruncherParams(Parameters):
     defaults = os.path.join(CURRENT_PATH, "defaults.json")
 
 
+# validated default parameters, built once per process by new_params()
+_PARAMS_TEMPLATES = {}
+
+
+def new_params(params_class):
+    """
+    Creates a params_class instance with default values. The defaults file is
+        parsed and validated once per process into a template that is only
+        ever copied, so the template itself is never modified.
+
+    Returns:
+        params: a new instance of params_class
+    """
+    template = _PARAMS_TEMPLATES.get(params_class)
+    if template is None:
+        template = params_class()
+        _PARAMS_TEMPLATES[params_class] = template
+    return copy.deepcopy(template)
+
+
+@lru_cache(maxsize=None)
+def taxsim_params():
+    """
+    Returns the names of the TAXSIM-style parameters in CruncherParams, in
+        the order of the TAXSIM-27 input columns
+    """
+    params = new_params(CruncherParams)
+    param_list = ["RECID", "year"]
+    for key, param in params.dump().items():
+        if key != "mtr_options" and "section_1" in param:
+            param_list.append(key)
+    return tuple(param_list)
+
+
+class CruncherResults:
+    """
+    Numeric results for one household, held as float arrays with one
+    element per output variable. Values are only turned into strings when
+    format() is called.
+
+    Parameters
+    ----------
+    labels: list of output variable labels
+
+    base: values under the baseline policy
+
+    reform: values under the reform
+
+    mtr: values under the reform with $1 added to the 'mtr_options' income
+        type, or None
+
+    mtr_label: label of the mtr values
+
+    change: values of the change from base to reform. The default is reform
+        minus base.
+
+    """
+
+    def __init__(
+        self, labels, base, reform, mtr=None, mtr_label="+ $1", change=None
+    ):
+        self.labels = list(labels)
+        self.base = np.asarray(base, dtype=np.float64)
+        self.reform = np.asarray(reform, dtype=np.float64)
+        self.mtr = None if mtr is None else np.asarray(mtr, dtype=np.float64)
+        self.mtr_label = mtr_label
+        if change is None:
+            self.change = self.reform - self.base
+        else:
+            self.change = np.asarray(change, dtype=np.float64)
+
+    def columns(self):
+        """
+        Returns a dictionary that maps column labels to value arrays
+        """
+        cols = {"Base": self.base, "Reform": self.reform}
+        if self.mtr is not None:
+            cols[self.mtr_label] = self.mtr
+        cols["Change"] = self.change
+        return cols
+
+    def to_dict(self):
+        """
+        Returns a dictionary with the labels and the value arrays themselves
+            (not copies)
+        """
+        results = {"labels": self.labels}
+        results.update(self.columns())
+        return results
+
+    def to_json(self, **kwargs):
+        """
+        Returns the results as a JSON string. kwargs are passed to json.dumps
+        """
+        results = {"labels": self.labels}
+        for label, values in self.columns().items():
+            results[label] = values.tolist()
+        return json.dumps(results, **kwargs)
+
+    def to_arrow(self):
+        """
+        Returns the results as a pyarrow Table that shares memory with the
+            value arrays. Requires pyarrow.
+        """
+        try:
+            import pyarrow as pa
+        except ImportError:
+            raise ImportError("CruncherResults.to_arrow() requires pyarrow")
+        data = {"labels": pa.array(self.labels)}
+        for label, values in self.columns().items():
+            data[label] = pa.array(values)
+        return pa.table(data)
+
+    def to_frame(self):
+        """
+        Returns the results as a numeric Pandas dataframe
+        """
+        return pd.DataFrame(self.columns(), index=self.labels)
+
+    def format(self, columns=None):
+        """
+        Formats values as strings with two decimals and thousands separators
+
+        columns: list of column labels to include. The default is all columns.
+
+        Returns:
+            a Pandas dataframe of strings
+        """
+        cols = self.columns()
+        if columns is None:
+            columns = list(cols)
+        return pd.DataFrame(
+            {
+                label: ["{:,.2f}".format(x) for x in cols[label]]
+                for label in columns
+            },
+            index=self.labels,
+        )
+
+
 class Cruncher:
     """
     Constructor for the Cruncher class
@@ -28,6 +171,17 @@ class Cruncher:
         preset reforms in the Tax-Calculator repo), change the adjustment
         file 'reform_options' field to 'Custom'.
 
+    baseline: file path to json policy reform file
+        Baseline policy. The default is current law.
+
+    lazy: boolean
+        If True, nothing is calculated when the instance is created.
+        Instead, each stage (policies, Records, Calculators and output
+        tables) is calculated the first time it is accessed and reused
+        afterwards, so e.g. basic_table() never builds the + $1
+        Calculator or the detailed table. Either way, the detailed table
+        in df_calc is formatted the first time it is accessed.
+
     Returns
     -------
     class instance: Cruncher
@@ -36,13 +190,61 @@ class Cruncher:
 
     INPUT_PATH = os.path.join(CURRENT_PATH, "adjustment_template.json")
 
-    def __init__(self, inputs=INPUT_PATH, custom_reform=None, baseline=None):
+    CALC_VARS = [
+        "c00100",
+        "e02300",
+        "c02500",
+        "standard",
+        "c04470",
+        "qbided",
+        "c04800",
+        "taxbc",
+        "c07220",
+        "c11070",
+        "c07180",
+        "eitc",
+        "c62100",
+        "c09600",
+        "niit",
+        "c05800",
+        "payrolltax",
+    ]
+
+    CALC_LABELS = [
+        "Adjusted Gross Income (AGI)",
+        "Unemployment Insurance in AGI",
+        "Social Security in AGI",
+        "Standard Deduction (Zero for Itemizers)",
+        "Itemized Deductions",
+        "Qualified Business Income Deduction",
+        "Taxable Income",
+        "Regular Tax Before Credits",
+        "Child Tax Credit (CTC)",
+        "CTC Refundable",
+        "Child Care Credit",
+        "Earned Income Tax Credit",
+        "Alternative Minimum Tax (AMT) Taxable Income",
+        "AMT Liability",
+        "Net Investment Income Tax",
+        "Income Tax Before Credits (Regular + AMT)",
+        "Payroll Tax (Employee + Employer)",
+    ]
+
+    def __init__(
+        self, inputs=INPUT_PATH, custom_reform=None, baseline=None, lazy=False
+    ):
         self.inputs = inputs
         self.custom_reform = custom_reform
         self.baseline = baseline
-        self.params = CruncherParams()
+        self.lazy = lazy
+        # positions of the household and its + $1 copy in stacked data
+        self.row = 0
+        self.row_mtr = 1
+        self.params = new_params(CruncherParams)
         self.adjustment = self.adjust_inputs()
         self.params.adjust(self.adjustment)
+        if self.lazy:
+            return
         self.ivar, self.mtr_options, self.reform_options = self.taxsim_inputs()
         self.batch_ivar = self.batch_inputs(self.ivar)
         self.data = self.translate(self.ivar)
@@ -53,7 +255,150 @@ class Cruncher:
         self.calc1, self.calc_reform, self.calc_mtr = self.run_calc()
         self.df_basic_vals = self.basic_vals()
         self.df_mtr = self.mtr_table()
-        self.df_calc = self.calc_table()
+        # the detailed table is only formatted when df_calc is first used
+
+    @classmethod
+    def many(cls, adjustments, custom_reform=None, baseline=None):
+        """
+        Creates one Cruncher per household and calculates all households
+            together. Households are validated before anything is
+            calculated, and households with the same year and reform are
+            stacked into a single Records object, so each policy needs one
+            Calculator per group rather than one per household.
+
+        Parameters
+        ----------
+        adjustments: list of input adjustment files or dictionaries, one per
+            household. See the Cruncher constructor.
+
+        custom_reform: file path to json policy reform file or dictionary,
+            applied to every household
+
+        baseline: file path to json policy reform file to use as the baseline
+
+        Returns
+        -------
+        crunchers: list of Cruncher instances in the order of adjustments,
+            whose basic_table(), calc_table() and mtr_table() methods return
+            the detail tables for each household
+
+        """
+        crunchers = []
+        errors = {}
+        for i, inputs in enumerate(adjustments):
+            try:
+                crunchers.append(
+                    cls(inputs, custom_reform, baseline, lazy=True)
+                )
+            except ValidationError as err:
+                for param, msgs in err.messages["errors"].items():
+                    errors["household {}: {}".format(i, param)] = msgs
+        # report the errors of all households at once
+        if errors:
+            raise ValidationError({"errors": errors}, None)
+
+        groups = {}
+        for c in crunchers:
+            key = (int(c.ivar.loc[0, 1]), c.reform_options)
+            groups.setdefault(key, []).append(c)
+
+        for group in groups.values():
+            ivar_stack = []
+            for i, c in enumerate(group):
+                c.row = 2 * i
+                c.row_mtr = 2 * i + 1
+                ivar_stack += [c.ivar, c.ivar2]
+            first = group[0]
+            data = first.translate(pd.concat(ivar_stack, ignore_index=True))
+            recs = first.make_records(data)
+            pol = first.pol
+            pol2 = first.pol2
+            calc1 = first.make_calc(pol, recs)
+            calc_reform = first.make_calc(pol2, recs)
+            for c in group:
+                c.pol = pol
+                c.pol2 = pol2
+                c.calc1 = calc1
+                c.calc_reform = calc_reform
+                c.calc_mtr = calc_reform
+
+        return crunchers
+
+    # In lazy mode, the attributes assigned at the end of __init__ are
+    # calculated on first access by the properties below. In eager mode,
+    # __init__ assigns them directly and the properties are never used.
+
+    @cached_property
+    def ivar(self):
+        return self.taxsim_inputs()[0]
+
+    @cached_property
+    def mtr_options(self):
+        return self.taxsim_inputs()[1]
+
+    @cached_property
+    def reform_options(self):
+        return self.taxsim_inputs()[2]
+
+    @cached_property
+    def batch_ivar(self):
+        return self.batch_inputs(self.ivar)
+
+    @cached_property
+    def data(self):
+        return self.translate(self.ivar)
+
+    @cached_property
+    def ivar2(self):
+        return self.choose_mtr()[0]
+
+    @cached_property
+    def mtr_wrt(self):
+        return self.choose_mtr()[1]
+
+    @cached_property
+    def data_mtr(self):
+        return self.translate(self.ivar2)
+
+    @cached_property
+    def pol(self):
+        return self.choose_baseline()
+
+    @cached_property
+    def pol2(self):
+        return self.choose_reform()
+
+    @cached_property
+    def data_stack(self):
+        return self.stack_data()
+
+    @cached_property
+    def recs_stack(self):
+        return self.make_records(self.data_stack)
+
+    @cached_property
+    def calc1(self):
+        return self.make_calc(self.pol, self.recs_stack)
+
+    @cached_property
+    def calc_reform(self):
+        return self.make_calc(self.pol2, self.recs_stack)
+
+    @cached_property
+    def calc_mtr(self):
+        return self.calc_reform
+
+    @cached_property
+    def df_basic_vals(self):
+        return self.basic_vals()
+
+    @cached_property
+    def df_mtr(self):
+        return self.mtr_table()
+
+    @cached_property
+    def df_calc(self):
+        return self.calc_table()
 
     def adjust_inputs(self):
         """
@@ -80,21 +425,9 @@ class Cruncher:
 
         self.reform_options = self.params.to_array("reform_options")
 
-        # construct list of taxsim param names
-        param_list = []
-        for key in self.params.dump().keys():
-            if key == "mtr_options":
-                pass
-            else:
-                if "section_1" in self.params.dump()[key]:
-                    param_list.append(key)
-
-        param_list.insert(0, "year")
-        param_list.insert(0, "RECID")
-
         # construct list of values for params
         param_vals = []
-        for param in param_list:
+        for param in taxsim_params():
             val = self.params.to_array(param)
             param_vals.append(val)
 
@@ -106,91 +439,20 @@ class Cruncher:
     def batch_inputs(self, ivar):
         """
         Translates string parameters to integers for Batch processing.
+            See translator.batch_inputs().
         """
-        self.batch_ivar = ivar
-        # convert mstat to int
-        mstat = ivar.loc[:, 2]
-        # Single -> 1; Joint -> 2
-        mstat_int = np.where(mstat == "Single", 1, 2)
-        # convert sstb to int
-        sstb = ivar.loc[:, 16]
-        # True -> 1; False -> 0
-        sstb_int = np.where(sstb, 1, 0)
-        self.batch_ivar.loc[:, 2] = mstat_int
-        self.batch_ivar.loc[:, 16] = sstb_int
+        self.batch_ivar = translator.batch_inputs(ivar)
         return self.batch_ivar
 
     def translate(self, ivar):
         """
         Translate TAXSIM-27 input variables into Tax-Calculator input variables.
+            See translator.translate().
 
         Returns:
             self.invar: a Pandas dataframe with Tax-Calculator variables
         """
-        self.invar = pd.DataFrame()
-        self.invar["RECID"] = ivar.loc[:, 0]
-        self.invar["FLPDYR"] = ivar.loc[:, 1]
-        # no Tax-Calculator use of TAXSIM variable 3, state code
-        mstat = ivar.loc[:, 2]
-        self.invar["age_head"] = ivar.loc[:, 3]
-        self.invar["age_spouse"] = ivar.loc[:, 4]
-
-        nu13 = ivar.loc[:, 5]
-        self.invar["f2441"] = nu13
-        n1316 = ivar.loc[:, 6]
-        self.invar["n24"] = nu13 + n1316
-        n1719 = ivar.loc[:, 7]
-        num_eitc_qualified_kids = nu13 + n1316 + n1719
-
-        self.invar["EIC"] = np.minimum(num_eitc_qualified_kids, 3)
-        other_dep = ivar.loc[:, 8]
-        num_deps = num_eitc_qualified_kids + other_dep
-        # convert both Cruncher and Batch inputs (i.e. Single/Joint
-        # and 0/1)
-        mars = np.where(
-            np.logical_or(mstat.astype(str) == "Single", mstat == 1),
-            np.where(num_deps > 0, 4, 1),
-            2,
-        )
-        self.invar["MARS"] = mars
-        assert np.all(
-            np.logical_or(mars == 1, np.logical_or(mars == 2, mars == 4))
-        )
-        num_taxpayers = np.where(mars == 2, 2, 1)
-        self.invar["XTOT"] = num_taxpayers + num_deps
-        self.invar["e00200p"] = ivar.loc[:, 9]
-        self.invar["e00200s"] = ivar.loc[:, 10]
-        self.invar["e00200"] = self.invar["e00200p"] + self.invar["e00200s"]
-        self.invar["e00650"] = ivar.loc[:, 11]
-        self.invar["e00600"] = self.invar["e00650"]
-        self.invar["e00300"] = ivar.loc[:, 12]
-        self.invar["p22250"] = ivar.loc[:, 13]
-        self.invar["p23250"] = ivar.loc[:, 14]
-        self.invar["e26270"] = ivar.loc[:, 15]
-        sstb_bool = ivar.loc[:, 16]
-        # convert both Cruncher and Batch inputs (i.e. True/False and 0/1
-        self.invar["PT_SSTB_income"] = np.where(
-            np.logical_or(sstb_bool, sstb_bool == 1), 1, 0
-        )
-        self.invar["PT_binc_w2_wages"] = ivar.loc[:, 17]
-        self.invar["PT_ubia_property"] = ivar.loc[:, 18]
-
-        e02000 = ivar.loc[:, 19]
-        self.invar["e00800"] = ivar.loc[:, 20]
-        self.invar["e01700"] = ivar.loc[:, 21]
-        self.invar["e01500"] = self.invar["e01700"]
-        self.invar["e02400"] = ivar.loc[:, 22]
-        self.invar["e02300"] = ivar.loc[:, 23]
-        # no Tax-Calculator use of TAXSIM variable 22, non-taxable transfers
-        # no Tax-Calculator use of TAXSIM variable 23, rent paid
-        self.invar["e18500"] = ivar.loc[:, 24]
-        self.invar["e18400"] = ivar.loc[:, 25]
-        self.invar["e32800"] = ivar.loc[:, 26]
-        self.invar["e19200"] = ivar.loc[:, 27]
-
-        # e26270 is included in e02000
-        self.invar["e02000"] = self.invar["e26270"] + e02000
-
+        self.invar = translator.translate(ivar)
         return self.invar
 
     def choose_mtr(self):
@@ -202,41 +464,10 @@ class Cruncher:
             self.ivar2: a Pandas dataframe with Taxsim-style variables
             self.mtr_wrt: User's choice for MTR analysis as a Tax-Calculator variable
         """
+        col, self.mtr_wrt = MTR_OPTIONS[self.mtr_options]
         self.ivar2 = self.ivar.copy()
-        if self.mtr_options == "Taxpayer Earnings":
-            self.ivar2.loc[:, 9] = self.ivar2.loc[:, 9] + 1
-            self.mtr_wrt = "e00200p"
-            return self.ivar2, self.mtr_wrt
-        elif self.mtr_options == "Spouse Earnings":
-            self.ivar2.loc[:, 10] = self.ivar2.loc[:, 10] + 1
-            return self.ivar2, "e00200s"
-        elif self.mtr_options == "Qualified Dividends":
-            self.ivar2.loc[:, 11] = self.ivar2.loc[:, 11] + 1
-            return self.ivar2, "e00650"
-        elif self.mtr_options == "Interest Received":
-            self.ivar2.loc[:, 12] = self.ivar2.loc[:, 12] + 1
-            return self.ivar2, "e00300"
-        elif self.mtr_options == "Short Term Gains":
-            self.ivar2.loc[:, 13] = self.ivar2.loc[:, 13] + 1
-            return self.ivar2, "p22250"
-        elif self.mtr_options == "Long Term Gains":
-            self.ivar2.loc[:, 14] = self.ivar2.loc[:, 14] + 1
-            return self.ivar2, "p23250"
-        elif self.mtr_options == "Business Income":
-            self.ivar2.loc[:, 15] = self.ivar2.loc[:, 15] + 1
-            return self.ivar2, "e26270"
-        elif self.mtr_options == "Pensions":
-            self.ivar2.loc[:, 21] = self.ivar2.loc[:, 21] + 1
-            return self.ivar2, "e01700"
-        elif self.mtr_options == "Gross Social Security Benefits":
-            self.ivar2.loc[:, 22] = self.ivar2.loc[:, 22] + 1
-            return self.ivar2, "e02400"
-        elif self.mtr_options == "Real Estate Taxes Paid":
-            self.ivar2.loc[:, 24] = self.ivar2.loc[:, 24] + 1
-            return self.ivar2, "e18500"
-        elif self.mtr_options == "Mortgage":
-            self.ivar2.loc[:, 27] = self.ivar2.loc[:, 27] + 1
-            return self.ivar2, "e19200"
+        self.ivar2.loc[:, col] = self.ivar2.loc[:, col] + 1
+        return self.ivar2, self.mtr_wrt
 
     def choose_baseline(self):
         """
@@ -247,36 +478,13 @@ class Cruncher:
         Returns:
             self.pol: Tax-Calculator Policy object for baseline policy
         """
-        REFORMS_URL = (
-            "https://raw.githubusercontent.com/"
-            "PSLmodels/Tax-Calculator/master/taxcalc/reforms/"
-        )
+        year = int(self.ivar.loc[0, 1])
 
-        # if no baseline policy is specified, baseline is current law
-        if self.baseline is None:
-            self.pol = tc.Policy()
-        # if a baseline policy is specified, first see if user created json
-        # policy file
-        else:
-            exists = os.path.isfile(self.baseline)
-            if exists:
-                baseline_file = self.baseline
-                self.pol = tc.Policy()
-                self.pol.implement_reform(
-                    tc.Policy.read_json_reform(baseline_file)
-                )
-            # if the user did not create a json file, try the Tax-Calculator
-            # reforms file
-            else:
-                try:
-                    baseline_file = self.baseline
-                    baseline_url = REFORMS_URL + baseline_file
-                    self.pol = tc.Policy()
-                    self.pol.implement_reform(
-                        tc.Policy.read_json_reform(baseline_url)
-                    )
-                except:
-                    print("Baseline file does not exist")
+        # if no baseline policy is specified, baseline is current law.
+        # otherwise, the baseline is a user-created json policy file or a
+        # file from the Tax-Calculator reforms folder. An unknown baseline
+        # raises reforms.ReformNotFoundError.
+        self.pol = reforms.get_policy(self.baseline, year)
 
         return self.pol
 
@@ -287,41 +495,23 @@ class Cruncher:
         Returns:
             self.pol2: Tax-Calculator Policy object for reform analysis
         """
-        REFORMS_URL = (
-            "https://raw.githubusercontent.com/"
-            "PSLmodels/Tax-Calculator/master/taxcalc/reforms/"
-        )
+        year = int(self.ivar.loc[0, 1])
 
         # if user specified a preset reform in their adjustment file, pull
         # reform from Tax-Calculator reforms folder
         if self.reform_options != "None" and self.custom_reform is None:
-            reform_name = self.reform_options
-            reform_url = REFORMS_URL + reform_name
-            self.pol2 = tc.Policy()
-            self.pol2.implement_reform(tc.Policy.read_json_reform(reform_url))
+            self.pol2 = reforms.get_policy(self.reform_options, year)
         # otherwise, look for user-provided json reform file
         # first as file path
         elif self.reform_options == "None" and isinstance(
             self.custom_reform, str
         ):
-            try:
-                reform_filename = self.custom_reform
-                self.pol2 = tc.Policy()
-                self.pol2.implement_reform(
-                    tc.Policy.read_json_reform(reform_filename)
-                )
-            except:
-                print("Reform file path does not exist")
+            self.pol2 = reforms.get_policy(self.custom_reform, year)
         # then as dictionary
         elif self.reform_options == "None" and isinstance(
             self.custom_reform, dict
         ):
-            reform = self.custom_reform
-            self.pol2 = tc.Policy()
-            try:
-                self.pol2.implement_reform(reform)
-            except:
-                self.pol2.adjust(reform)
+            self.pol2 = reforms.get_policy(self.custom_reform, year)
         # raise error if preset reform is chosen and custom reform is specified
         elif self.reform_options != "None" and self.custom_reform is not None:
             raise AttributeError(
@@ -329,41 +519,95 @@ class Cruncher:
             )
         # if no reform file was given, set reform to current law
         else:
-            self.pol2 = tc.Policy()
+            self.pol2 = reforms.get_policy(year=year)
 
         return self.pol2
 
-    def run_calc(self):
+    def stack_data(self):
         """
-        Creates baseline, reform, and + $1 Tax-Calculator objects
+        Stacks the household and its + $1 copy so that both can be
+            calculated in one pass for policies that need both
 
         Returns:
-            self.calc1: Calculator object for current law
-            self.calc_reform: Calculator object for reform
-            self.calc_mtr: Calculator object for + $1
+            self.data_stack: a Pandas dataframe with Tax-Calculator variables,
+                with the household in row self.row and the + $1 copy in
+                row self.row_mtr
         """
-        year = int(self.data.loc[0, "FLPDYR"])
-        recs = tc.Records(
-            data=self.data, start_year=year, gfactors=None, weights=None
+        self.data_stack = pd.concat(
+            [self.data, self.data_mtr], ignore_index=True
         )
+        return self.data_stack
 
-        self.calc1 = tc.Calculator(policy=self.pol, records=recs)
-        self.calc1.advance_to_year(year)
-        self.calc1.calc_all()
+    def make_records(self, data):
+        """
+        Creates a Tax-Calculator Records object from translated input data
 
-        self.calc_reform = tc.Calculator(policy=self.pol2, records=recs)
-        self.calc_reform.advance_to_year(year)
-        self.calc_reform.calc_all()
+        Returns:
+            recs: Records object for the year of the input data
+        """
+        # Tax-Calculator is imported on first use, so that e.g. validating
+        # inputs with CruncherParams does not pay for importing it
+        import taxcalc as tc
 
-        recs_mtr = tc.Records(
-            data=self.data_mtr, start_year=year, gfactors=None, weights=None
+        year = int(data.loc[0, "FLPDYR"])
+        return tc.Records(
+            data=data, start_year=year, gfactors=None, weights=None
         )
-        self.calc_mtr = tc.Calculator(policy=self.pol2, records=recs_mtr)
-        self.calc_mtr.advance_to_year(year)
-        self.calc_mtr.calc_all()
+
+    def make_calc(self, policy, recs):
+        """
+        Creates a Tax-Calculator object and runs calc_all() for the year of
+            the input data
+
+        Returns:
+            calc: Calculator object for the given policy and records
+        """
+        import taxcalc as tc
+
+        calc = tc.Calculator(policy=policy, records=recs)
+        calc.advance_to_year(recs.data_year)
+        calc.calc_all()
+        return calc
+
+    def run_calc(self):
+        """
+        Creates baseline, reform, and + $1 Tax-Calculator objects
+
+        Returns:
+            self.calc1: stacked Calculator object for current law
+            self.calc_reform: stacked Calculator object for reform
+            self.calc_mtr: Calculator object for + $1, which is the same
+                stacked Calculator as self.calc_reform
+        """
+        # the household and + $1 rows are stacked into one Records object,
+        # so each policy is calculated in a single pass that also provides
+        # the marginal tax rates
+        self.calc1 = self.make_calc(self.pol, self.recs_stack)
+        self.calc_reform = self.make_calc(self.pol2, self.recs_stack)
+        self.calc_mtr = self.calc_reform
 
         return self.calc1, self.calc_reform, self.calc_mtr
 
+    def row_array(self, calc, variables, row):
+        """
+        Extracts the values of one household from a (stacked) Calculator
+
+        Returns:
+            a numpy array with one value per variable
+        """
+        return np.array(
+            [calc.array(var)[row] for var in variables], dtype=np.float64
+        )
+
+    def row_values(self, calc, variables, row):
+        """
+        Extracts the values of one household from a (stacked) Calculator
+
+        Returns:
+            a Pandas dataframe with one column and one row per variable
+        """
+        return calc.dataframe(variables).iloc[[row]].transpose()
+
     def basic_vals(self):
         """
         Creates basic output table
@@ -373,11 +617,9 @@ class Cruncher:
         """
 
         basic = ["iitax", "payrolltax"]
-        basic_vals1 = self.calc1.dataframe(basic)
-        basic_vals1 = basic_vals1.transpose()
+        basic_vals1 = self.row_values(self.calc1, basic, self.row)
 
-        basic_vals2 = self.calc_reform.dataframe(basic)
-        basic_vals2 = basic_vals2.transpose()
+        basic_vals2 = self.row_values(self.calc_reform, basic, self.row)
 
         self.basic_vals = pd.concat([basic_vals1, basic_vals2], axis=1)
         self.basic_vals.columns = ["Base", "Reform"]
@@ -394,29 +636,34 @@ class Cruncher:
 
         return self.basic_vals
 
-    def mtr_table(self):
+    def row_mtrs(self, calc):
         """
-        Creates MTR table
+        Calculates marginal tax rates from the household and + $1 rows of a
+            stacked Calculator, i.e. the change in taxes per dollar of the
+            income type in 'mtr_options'
 
         Returns:
-            self.df_mtr: a Pandas dataframe MTR results with respect to 'mtr_options'
+            a Pandas dataframe with income tax and payroll tax marginal rates
         """
-
-        mtr_calc = self.calc1.mtr(
-            calc_all_already_called=True, wrt_full_compensation=False
-        )
-        self.mtr_df = pd.DataFrame(
-            data=[mtr_calc[1], mtr_calc[0]],
+        taxes = calc.dataframe(["iitax", "payrolltax"])
+        mtrs = taxes.iloc[self.row_mtr] - taxes.iloc[self.row]
+        return pd.DataFrame(
+            data=[[mtrs["iitax"]], [mtrs["payrolltax"]]],
             index=["Income Tax Marginal Rate", "Payroll Tax Marginal Rate"],
         )
 
-        mtr_calc_reform = self.calc_reform.mtr(
-            calc_all_already_called=True, wrt_full_compensation=False
-        )
-        mtr_df_reform = pd.DataFrame(
-            data=[mtr_calc_reform[1], mtr_calc_reform[0]],
-            index=["Income Tax Marginal Rate", "Payroll Tax Marginal Rate"],
-        )
+    def mtr_table(self):
+        """
+        Creates MTR table from the same stacked Calculators as the + $1
+            column of the detailed table, so no additional calculations
+            are needed
+
+        Returns:
+            self.df_mtr: a Pandas dataframe MTR results with respect to 'mtr_options'
+        """
+        self.mtr_df = self.row_mtrs(self.calc1)
+
+        mtr_df_reform = self.row_mtrs(self.calc_reform)
 
         self.df_mtr = pd.concat([self.mtr_df, mtr_df_reform], axis=1)
         self.df_mtr.columns = ["Base", "Reform"]
@@ -427,99 +674,124 @@ class Cruncher:
 
         return self.df_mtr
 
-    def basic_table(self):
+    def mtr_matrix(self):
         """
-        Combines output from basic_vals() and mtr_table() to create table with basic output
+        Creates a table of marginal tax rates with respect to every income
+            type in 'mtr_options'. The household is replicated once per
+            income type with $1 added to that income type, and all copies
+            are calculated in a single pass per policy.
 
         Returns:
-            self.df_mtr: a Pandas dataframe with basic output
-        """
-        self.df_basic = pd.concat(
-            [
-                self.df_basic_vals.iloc[:1],
-                self.df_mtr.iloc[:1],
-                self.df_basic_vals.iloc[1:],
-                self.df_mtr.iloc[1:],
-            ]
+            self.df_mtr_matrix: a Pandas dataframe with one row per income
+                type and income tax, payroll tax and combined marginal
+                rates (in percent) for base, reform, and change. Rates
+                with respect to spouse earnings are missing for filers who
+                are not married.
+        """
+        # spouse earnings can only be increased for joint filers
+        joint = self.data.loc[0, "MARS"] == 2
+        ivar_all = [self.ivar]
+        for col, mtr_wrt in MTR_OPTIONS.values():
+            ivar_marg = self.ivar.copy()
+            if joint or mtr_wrt != "e00200s":
+                ivar_marg.loc[:, col] = ivar_marg.loc[:, col] + 1
+            ivar_all.append(ivar_marg)
+        data = self.translate(pd.concat(ivar_all, ignore_index=True))
+        recs = self.make_records(data)
+
+        taxes = ["Income Tax", "Payroll Tax", "Combined"]
+        mtrs = []
+        for policy in [self.pol, self.pol2]:
+            calc = self.make_calc(policy, recs)
+            df = calc.dataframe(["iitax", "payrolltax"])
+            df["combined"] = df["iitax"] + df["payrolltax"]
+            # rows after the first are the + $1 copies
+            mtrs.append((df.iloc[1:] - df.iloc[0]).to_numpy() * 100)
+        mtrs.append(mtrs[1] - mtrs[0])
+
+        self.df_mtr_matrix = pd.DataFrame(
+            data=np.hstack(mtrs),
+            index=list(MTR_OPTIONS),
+            columns=pd.MultiIndex.from_product(
+                [["Base", "Reform", "Change"], taxes]
+            ),
         )
+        if not joint:
+            self.df_mtr_matrix.loc["Spouse Earnings"] = np.nan
 
-        # format dataframe
-        for col in self.df_basic.columns:
-            self.df_basic[col] = self.df_basic[col].apply(
-                lambda x: "{:,.2f}".format(x)
-            )
-
-        return self.df_basic
+        return self.df_mtr_matrix
 
-    def calc_table(self):
+    def basic_results(self):
         """
-        Creates detailed output table
+        Creates numeric results for the basic output table
 
         Returns:
-            self.df_calc: a Pandas dataframe with federal tax calculations for base, reform, and + $1
+            a CruncherResults object with liabilities, rounded to cents as in
+                basic_vals(), and marginal tax rates
+        """
+        vals = self.df_basic_vals
+        mtr = self.df_mtr
+        # liabilities and marginal rates alternate
+        columns = {
+            col: [
+                vals[col].iloc[0],
+                mtr[col].iloc[0],
+                vals[col].iloc[1],
+                mtr[col].iloc[1],
+            ]
+            for col in ["Base", "Reform", "Change"]
+        }
+        return CruncherResults(
+            labels=[
+                "Individual Income Tax",
+                "Income Tax Marginal Rate",
+                "Employee + Employer Payroll Tax",
+                "Payroll Tax Marginal Rate",
+            ],
+            base=columns["Base"],
+            reform=columns["Reform"],
+            change=columns["Change"],
+        )
 
+    def calc_results(self):
         """
-        calculation = [
-            "c00100",
-            "e02300",
-            "c02500",
-            "standard",
-            "c04470",
-            "qbided",
-            "c04800",
-            "taxbc",
-            "c07220",
-            "c11070",
-            "c07180",
-            "eitc",
-            "c62100",
-            "c09600",
-            "niit",
-            "c05800",
-            "payrolltax",
-        ]
-        labels = [
-            "Adjusted Gross Income (AGI)",
-            "Unemployment Insurance in AGI",
-            "Social Security in AGI",
-            "Standard Deduction (Zero for Itemizers)",
-            "Itemized Deductions",
-            "Qualified Business Income Deduction",
-            "Taxable Income",
-            "Regular Tax Before Credits",
-            "Child Tax Credit (CTC)",
-            "CTC Refundable",
-            "Child Care Credit",
-            "Earned Income Tax Credit",
-            "Alternative Minimum Tax (AMT) Taxable Income",
-            "AMT Liability",
-            "Net Investment Income Tax",
-            "Income Tax Before Credits (Regular + AMT)",
-            "Payroll Tax (Employee + Employer)",
-        ]
+        Creates numeric results for the detailed output table
 
-        df_calc1 = self.calc1.dataframe(calculation).transpose()
+        Returns:
+            a CruncherResults object with federal tax calculations for base,
+                reform, + $1, and change
+        """
+        return CruncherResults(
+            labels=self.CALC_LABELS,
+            base=self.row_array(self.calc1, self.CALC_VARS, self.row),
+            reform=self.row_array(self.calc_reform, self.CALC_VARS, self.row),
+            mtr=self.row_array(self.calc_mtr, self.CALC_VARS, self.row_mtr),
+            mtr_label="+ $1 ({})".format(self.mtr_options),
+        )
 
-        df_calc2 = self.calc_reform.dataframe(calculation).transpose()
+    def basic_table(self):
+        """
+        Creates table with basic output from basic_results()
 
-        df_calc_mtr = self.calc_mtr.dataframe(calculation).transpose()
+        Returns:
+            self.df_basic: a Pandas dataframe with basic output
+        """
+        self.df_basic = self.basic_results().format(
+            ["Base", "Reform", "Change"]
+        )
 
-        self.df_calc = pd.concat([df_calc1, df_calc2, df_calc_mtr], axis=1)
+        return self.df_basic
 
-        mtr_label = "+ $1 ({})".format(self.mtr_options)
+    def calc_table(self):
+        """
+        Creates detailed output table from calc_results()
 
-        self.df_calc.columns = ["Base", "Reform", mtr_label]
-        self.df_calc.index = labels
+        Returns:
+            self.df_calc: a Pandas dataframe with federal tax calculations for base, reform, and + $1
 
-        self.df_calc.Base = self.df_calc.Base.apply(
-            lambda x: "{:,.2f}".format(x)
-        )
-        self.df_calc.Reform = self.df_calc.Reform.apply(
-            lambda x: "{:,.2f}".format(x)
-        )
-        self.df_calc[mtr_label] = self.df_calc[mtr_label].apply(
-            lambda x: "{:,.2f}".format(x)
-        )
+        """
+        results = self.calc_results()
+        self.df_calc = results.format(["Base", "Reform", results.mtr_label])
 
         return self.df_calc
 
@@ -532,11 +804,7 @@ class Cruncher:
             self.df_calc_diff: a Pandas dataframe with federal tax calculations for base, reform, and change
 
         """
-        self.df_calc_diff = self.df_calc.copy()
-        if len(self.df_calc_diff.columns) == 3:
-            del self.df_calc_diff["+ $1"]
-        calc_diff_vals = (
-            self.df_calc_diff["Reform"] - self.df_calc_diff["Base"]
+        self.df_calc_diff = self.calc_results().format(
+            ["Base", "Reform", "Change"]
         )
-        self.df_calc_diff["Change"] = calc_diff_vals
         return self.df_calc_diff
@@ -1,18 +1,73 @@
 import sys
 import os
+import hashlib
+import json
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
 import numpy as np
 import pandas as pd
 import taxcalc as tc
-import behresp as br
-from paramtools import Parameters
-from taxcrunch import cruncher as cr
+from paramtools import Parameters, ValidationError
+from taxcrunch import columnar, reforms, translator
+from taxcrunch.result_cache import ResultCache
+from taxcrunch.translator import MTR_OPTIONS
 from datetime import date
 
-
 CURRENT_PATH = os.path.abspath(os.path.dirname(__file__))
 
 FINITE_DIFF = 0.01
 
+# integer types tried, smallest first, for compact inputs and tables
+INT_DTYPES = (np.int8, np.int16, np.int32, np.int64)
+
+# number of input rows read and calculated at a time in streaming mode
+CHUNKSIZE = 100000
+
+# number of rows behresp calculates at a time; it copies the Calculators it
+# is given and returns every Tax-Calculator variable for them
+RESPONSE_CHUNKSIZE = 100000
+
+# worker pools are kept for the life of the process, so that the imports and
+# the Policy cache of each worker stay warm across calls
+_POOLS = {}
+
+
+def _init_worker():
+    # pay for the Tax-Calculator import once per worker, not once per shard
+    import taxcalc
+
+
+def get_pool(n_jobs):
+    """
+    Returns the process pool with n_jobs workers, creating it on first use
+    """
+    pool = _POOLS.get(n_jobs)
+    if pool is None:
+        pool = ProcessPoolExecutor(
+            max_workers=n_jobs, initializer=_init_worker
+        )
+        _POOLS[n_jobs] = pool
+    return pool
+
+
+def shutdown_pools():
+    """
+    Shuts down the worker processes started by parallel Batch runs
+    """
+    while _POOLS:
+        _, pool = _POOLS.popitem()
+        pool.shutdown()
+
+
+def _run_shard(ivar, options, method, kwargs):
+    return getattr(Batch(ivar, **options), method)(**kwargs)
+
+
+class NoValidRowsError(ValueError):
+    """
+    Raised when every input row of a Batch fails validation
+    """
+
 
 class BatchParams(Parameters):
 
@@ -28,23 +83,285 @@ class BatchParams(Parameters):
         return super().adjust(params)
 
 
+def read_csv(path, chunksize=None):
+    """
+    Reads a headerless csv input file with the C parser. Round-trip float
+        parsing gives exactly the values the slower Python parser gives.
+    """
+    return pd.read_csv(
+        path,
+        sep=",",
+        header=None,
+        float_precision="round_trip",
+        chunksize=chunksize,
+    )
+
+
+@lru_cache(maxsize=None)
+def input_rules():
+    """
+    Reads the type and range of each input column from defaults_batch.json
+
+    Returns:
+        rules: tuple of (name, type, min, max) tuples in input column order
+    """
+    with open(BatchParams.defaults) as f:
+        defaults = json.load(f)
+    rules = []
+    for name, param in defaults.items():
+        if name == "schema":
+            continue
+        bounds = param.get("validators", {}).get("range", {})
+        rules.append(
+            (
+                name,
+                param["type"],
+                float(bounds.get("min", -np.inf)),
+                float(bounds.get("max", np.inf)),
+            )
+        )
+    return tuple(rules)
+
+
+def validate_inputs(ivar):
+    """
+    Checks every input row against the types and ranges in
+        defaults_batch.json, one column at a time
+
+    ivar: Pandas dataframe with the 28 TAXSIM-style input columns
+
+    Returns:
+        values: float array of the inputs, with NaN where a value is not a
+            number
+        bad: boolean array that is True for each invalid row
+        errors: Pandas dataframe with one line per invalid value and the
+            columns row (position in ivar), param, value and reason
+    """
+    values = np.empty(ivar.shape)
+    for col in range(ivar.shape[1]):
+        column = ivar.iloc[:, col]
+        if column.dtype == object:
+            column = pd.to_numeric(column, errors="coerce")
+        values[:, col] = column.to_numpy(dtype=np.float64)
+    bad = np.zeros(len(ivar), dtype=bool)
+    errors = []
+    for col, (name, kind, low, high) in enumerate(input_rules()):
+        column = values[:, col]
+        checks = [
+            (np.isnan(column), "missing or not a number"),
+            (column < low, "< min {:g}".format(low)),
+            (column > high, "> max {:g}".format(high)),
+        ]
+        if kind in ("int", "bool"):
+            with np.errstate(invalid="ignore"):
+                checks.append((np.mod(column, 1) != 0, "not a valid integer"))
+        for mask, reason in checks:
+            bad |= mask
+            for row in np.flatnonzero(mask):
+                errors.append((row, name, ivar.iat[row, col], reason))
+    errors = pd.DataFrame(errors, columns=["row", "param", "value", "reason"])
+    return values, bad, errors.sort_values("row", kind="stable")
+
+
+@lru_cache(maxsize=None)
+def compact_dtypes():
+    """
+    Returns the smallest integer type that holds the range of each integer
+        input column in defaults_batch.json, and float64 for the others
+    """
+    dtypes = []
+    for name, kind, low, high in input_rules():
+        dtype = np.float64
+        if kind in ("int", "bool"):
+            for int_type in INT_DTYPES:
+                info = np.iinfo(int_type)
+                if info.min <= low and high <= info.max:
+                    dtype = int_type
+                    break
+        dtypes.append(dtype)
+    return tuple(dtypes)
+
+
+def compact_array(values):
+    """
+    Stores float values in the smallest type that holds them exactly: an
+        integer type if they are all whole numbers, otherwise float32 if
+        that loses nothing, otherwise float64
+    """
+    if values.dtype.kind != "f" or len(values) == 0:
+        return values
+    if np.isfinite(values).all() and (np.mod(values, 1) == 0).all():
+        for int_type in INT_DTYPES:
+            info = np.iinfo(int_type)
+            if info.min <= values.min() and values.max() <= info.max:
+                return values.astype(int_type)
+    small = values.astype(np.float32)
+    if np.array_equal(small, values, equal_nan=True):
+        return small
+    return values
+
+
+def compact_table(df):
+    """
+    Converts each column of a table with compact_array()
+    """
+    return df.astype(
+        {
+            label: compact_array(df[label].to_numpy()).dtype
+            for label in df.columns
+        }
+    )
+
+
+@lru_cache(maxsize=None)
+def versions():
+    """
+    Returns the versions of the packages that Batch results and the result
+        cache files they are stored in depend on
+    """
+    from importlib import metadata
+    from taxcrunch import __version__
+
+    try:
+        behresp_version = metadata.version("behresp")
+    except metadata.PackageNotFoundError:
+        behresp_version = None
+    return {
+        "taxcalc": tc.__version__,
+        "behresp": behresp_version,
+        "taxcrunch": __version__,
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+    }
+
+
+@lru_cache(maxsize=None)
+def records_row_bytes():
+    """
+    Returns the bytes a Tax-Calculator Records object uses per filer, from
+        the variables it reads and calculates
+    """
+    path = os.path.join(
+        tc.Records.VARINFO_FILE_PATH, tc.Records.VARINFO_FILE_NAME
+    )
+    with open(path) as f:
+        varinfo = json.load(f)
+    return sum(
+        4 if var["type"] == "int" else 8
+        for section in ("read", "calc")
+        for var in varinfo[section].values()
+    )
+
+
 class Batch:
     """
     Constructor for the Batch class
 
     Parameters
     ----------
-    path: file path to csv file with input data or a Pandas DataFrame
+    path: file path to csv file with input data, a Parquet, Feather or Arrow
+        file with the same columns (see columnar.py), or a Pandas DataFrame
         Make sure that the file is formatted according to the instructions in the README
 
+    quarantine: what to do with input rows that fail validation. By default
+        any invalid row raises a ValidationError. If True, invalid rows are
+        left out of the analysis; if a file path, they are also written to
+        that csv file with the reasons they were rejected in the last column.
+        The reasons are kept in the invalid attribute either way, see
+        validate_inputs().
+
+    first_row: position of the first row of path in a larger input file that
+        is read in chunks, see iter_tables(). Row numbers of invalid values
+        count from it, and if it is not 0, invalid rows are appended to the
+        quarantine file instead of replacing it.
+
+    mtr_options: income types to calculate marginal tax rates for, from the
+        keys of MTR_OPTIONS. Each one adds payroll tax, income tax and
+        combined MTR columns to the tables.
+
+    finite_diff: dollar amount added to each income type to calculate MTRs
+
+    compact: store integer inputs such as year, marital status, ages and
+        dependent counts as small integers, and return tables in the
+        smallest types that hold their values exactly (see compact_array()).
+        Use memory_estimate() to see what a table will need.
+
+    cache: a ResultCache, the directory of one, or True for the default
+        result cache. Tables are then stored on disk under a hash of the
+        input data, the reforms, the Tax-Calculator version and the method
+        arguments, and a later call with the same hash returns the stored
+        table without calculating it. The default is not to cache.
+
+    incremental: recalculate only the rows that changed since the last run
+        on the same input file. Requires a cache; each table is stored with
+        a hash of every input row, and the next create_table() or
+        create_diff_table() call with the same arguments matches rows by
+        RECID, calculates the added and changed rows and splices them into
+        the stored table. Runs are told apart by the path of the input
+        file, so a DataFrame input needs a run name in place of True.
+        RECIDs must be unique. Tables are not looked up by the hash of the
+        input data in this mode. Every row is still read, validated and
+        hashed, but only the changed rows are translated and calculated;
+        metadata["dedup"] is filled in when the inputs are first translated.
+        What was reused is recorded in metadata["incremental"].
+
+    Input rows that are identical apart from RECID are calculated once and
+    their results copied to each row; metadata["dedup"] has the number of
+    rows, the number of unique households and the ratio of the two.
+
     Returns
     -------
     class instance: Batch
 
     """
 
-    def __init__(self, path):
+    def __init__(
+        self,
+        path,
+        quarantine=None,
+        mtr_options=("Taxpayer Earnings",),
+        finite_diff=FINITE_DIFF,
+        compact=False,
+        cache=None,
+        incremental=False,
+        first_row=0,
+    ):
         self.path = path
+        self.quarantine = quarantine
+        self.first_row = first_row
+        if cache is True:
+            cache = ResultCache()
+        elif isinstance(cache, (str, os.PathLike)):
+            cache = ResultCache(cache)
+        self.cache = cache
+        if incremental and cache is None:
+            raise ValueError("incremental requires a result cache")
+        if incremental is True and not isinstance(path, (str, os.PathLike)):
+            raise ValueError(
+                "incremental=True requires an input file path; pass a run "
+                "name as incremental for other inputs"
+            )
+        self.incremental = incremental
+        # information about the inputs and how the last table was calculated
+        self.metadata = {}
+        if isinstance(mtr_options, str):
+            mtr_options = [mtr_options]
+        for option in mtr_options:
+            if option not in MTR_OPTIONS:
+                raise ValueError(
+                    "{} is not one of the mtr_options {}".format(
+                        option, list(MTR_OPTIONS)
+                    )
+                )
+        self.mtr_options = list(mtr_options)
+        self.finite_diff = finite_diff
+        self.compact = compact
+        # arguments for the Batch objects of worker processes
+        self.options = dict(
+            mtr_options=self.mtr_options,
+            finite_diff=self.finite_diff,
+            compact=self.compact,
+        )
         self.invar, self.invar_marg, self.rows = self.read_input()
 
         self.TC_VARS = [
@@ -91,47 +408,275 @@ class Batch:
             "Qualified Business Income Deduction",
         ]
 
-        self.MTR_LABELS = ["Payroll Tax MTR", "Income Tax MTR", "Combined MTR"]
+        self.MTR_LABELS = []
+        for option in self.mtr_options:
+            # taxpayer earnings MTRs keep their original labels
+            if option == "Taxpayer Earnings":
+                suffix = ""
+            else:
+                suffix = " ({})".format(option)
+            for label in ["Payroll Tax MTR", "Income Tax MTR", "Combined MTR"]:
+                self.MTR_LABELS.append(label + suffix)
 
     def read_input(self):
         """
         Reads csv input file
 
         Returns
-            self.invar: Tax-Calculator style dataframe of inputs
-            self.rows: number of rows of input file
+            self.invar: Tax-Calculator style dataframe of the unique inputs,
+                None when incremental until first used
+            self.invar_marg: self.invar with finite_diff added, stacked once
+                per MTR option, None when incremental until first used
+            self.rows: number of valid rows of input file
         """
-
+        # calculations memoized for earlier inputs no longer apply
+        self.clear_scenarios()
         if isinstance(self.path, pd.DataFrame):
             ivar = self.path
+        elif columnar.file_format(self.path) is not None:
+            ivar = columnar.read_inputs(self.path)
         else:
-            ivar = pd.read_csv(
-                self.path, sep=",", engine="python", header=None
-            )
+            ivar = read_csv(self.path)
         # check that input CSV has 28 columns
         assert len(ivar.columns) == 28
-        # check that year is the same across all rows
-        assert ivar[1].max() == ivar[1].min()
-        rows = len(ivar)
-        params = BatchParams()
+        # TAXSIM inputs as read, used to split the data across workers
+        self.ivar = ivar
         # validate input
-        params.adjust(ivar)
-        array = np.empty((0, rows))
-        for label in params._data:
-            array = np.append(
-                array, [params._data[label]["value"][0]["value"]], axis=0
-            )
-        params_df = pd.DataFrame(array).transpose()
+        values, bad, self.invalid = validate_inputs(ivar)
+        self.invalid["row"] += self.first_row
+        # positions of the analyzed rows in the input file
+        self.input_rows = self.first_row + np.flatnonzero(~bad)
+        if bad.any():
+            if not self.quarantine:
+                errors = {}
+                for row, name, value, reason in self.invalid.itertuples(
+                    index=False
+                ):
+                    errors.setdefault(name, []).append(
+                        "row {}: {} {}".format(row, value, reason)
+                    )
+                raise ValidationError({"errors": errors}, None)
+            if self.quarantine is not True:
+                bad_rows = ivar.iloc[bad].copy()
+                messages = self.invalid.param + " " + self.invalid.reason
+                bad_rows["reasons"] = (
+                    messages.groupby(self.invalid.row).agg("; ".join).values
+                )
+                bad_rows.to_csv(
+                    self.quarantine,
+                    mode="a" if self.first_row else "w",
+                    header=False,
+                    index=False,
+                )
+            if bad.all():
+                raise NoValidRowsError("None of the input rows are valid")
+            ivar = ivar.iloc[~bad].reset_index(drop=True)
+            values = values[~bad]
+            self.ivar = ivar
+        if self.cache is not None:
+            # identifies the validated inputs in result cache keys
+            self.input_key = hashlib.sha256(values.tobytes()).hexdigest()
+        if self.incremental:
+            # one hash per row to find the rows that changed between runs
+            self.row_hashes = pd.util.hash_pandas_object(
+                pd.DataFrame(values), index=False
+            ).to_numpy()
+        rows = len(values)
+        self._values = values
+        self._invar = self._invar_marg = None
+        if not self.incremental:
+            self.translate_inputs()
+        # incremental runs translate the inputs on first use, since
+        # update_table() only calculates the rows that changed
+        return self._invar, self._invar_marg, rows
+
+    def translate_inputs(self):
+        """
+        Removes duplicate households from the validated inputs of
+            read_input() and translates them into Tax-Calculator variables
 
-        params_marg = params_df.copy()
-        params_marg.loc[:, 9] = params_marg.loc[:, 9] + FINITE_DIFF
+        Returns
+            self.invar: Tax-Calculator style dataframe of the unique inputs
+            self.invar_marg: self.invar with finite_diff added, stacked once
+                per MTR option
+        """
+        values = self._values
+        # households that are identical apart from RECID are calculated once
+        # and their results are copied to every row, see scatter()
+        rows = len(values)
+        codes = (
+            pd.DataFrame(values[:, 1:])
+            .groupby(list(range(27)), sort=False, dropna=False)
+            .ngroup()
+            .to_numpy()
+        )
+        _, first = np.unique(codes, return_index=True)
+        if len(first) < rows:
+            self.recids = values[:, 0]
+            self.inverse = codes
+            values = values[first]
+        else:
+            self.recids = self.inverse = None
+        self.metadata["dedup"] = {
+            "rows": rows,
+            "unique": len(first),
+            "ratio": rows / len(first),
+        }
+        params_df = pd.DataFrame(values)
+        if self.compact:
+            params_df = params_df.astype(dict(enumerate(compact_dtypes())))
+
+        # one copy of the inputs per MTR option, with finite_diff added to
+        # the option's income type, stacked so that every policy needs a
+        # single Records pass for all MTRs
+        marg = []
+        for option in self.mtr_options:
+            col, var = MTR_OPTIONS[option]
+            params_marg = params_df.copy()
+            step = self.finite_diff
+            if var == "e00200s":
+                # only married filers have spouse earnings
+                step = np.where(params_df[2] == 2, step, 0)
+            params_marg.loc[:, col] = params_marg.loc[:, col] + step
+            marg.append(params_marg)
+        params_marg = pd.concat(marg, ignore_index=True)
 
         # translate INPUT variables into OUTPUT variables
-        c = cr.Cruncher()
-        self.invar = c.translate(params_df)
-        self.invar_marg = c.translate(params_marg)
-        self.rows = len(self.invar.index)
-        return self.invar, self.invar_marg, self.rows
+        self._invar = translator.translate(params_df)
+        self._invar_marg = translator.translate(params_marg)
+        self._values = None
+        return self._invar, self._invar_marg
+
+    @property
+    def invar(self):
+        """
+        Tax-Calculator style dataframe of the unique inputs
+        """
+        if self._invar is None:
+            self.translate_inputs()
+        return self._invar
+
+    @invar.setter
+    def invar(self, value):
+        self._invar = value
+
+    @property
+    def invar_marg(self):
+        """
+        self.invar with finite_diff added, stacked once per MTR option
+        """
+        if self._invar_marg is None:
+            self.translate_inputs()
+        return self._invar_marg
+
+    @invar_marg.setter
+    def invar_marg(self, value):
+        self._invar_marg = value
+
+    @classmethod
+    def iter_tables(
+        cls,
+        path,
+        chunksize=CHUNKSIZE,
+        method="create_table",
+        options=None,
+        **kwargs
+    ):
+        """
+        Reads the input file in chunks of rows and creates a table for each
+            chunk, so that memory use is bounded by chunksize instead of the
+            size of the input file.
+
+        path: file path to csv, Parquet, Feather or Arrow file with input
+            data or a Pandas DataFrame
+
+        chunksize: number of input rows in each chunk
+
+        method: "create_table" or "create_diff_table"
+
+        options: dictionary of arguments for the Batch object of every chunk,
+            e.g. {"mtr_options": ["Taxpayer Earnings", "Long Term Gains"]}.
+            A quarantine file collects the invalid rows of every chunk.
+
+        kwargs: arguments passed to method for every chunk
+
+        Returns:
+            a generator of Pandas dataframes. Each table is indexed by the
+                position of its rows in the input file, so quarantined rows
+                leave gaps in the index.
+        """
+        if method not in ("create_table", "create_diff_table"):
+            raise ValueError(
+                "method must be create_table or create_diff_table, not "
+                "{}".format(method)
+            )
+        if isinstance(path, pd.DataFrame):
+            chunks = (
+                path.iloc[start : start + chunksize]
+                for start in range(0, len(path), chunksize)
+            )
+        elif columnar.file_format(path) is not None:
+            chunks = columnar.iter_inputs(path, chunksize)
+        else:
+            chunks = read_csv(path, chunksize=chunksize)
+        options = dict(options or {})
+        quarantine = options.get("quarantine")
+        if quarantine and quarantine is not True:
+            # every chunk appends its invalid rows to an empty file
+            open(quarantine, "w").close()
+        start = 0
+        for chunk in chunks:
+            try:
+                batch = cls(
+                    chunk.reset_index(drop=True), first_row=start, **options
+                )
+            except NoValidRowsError:
+                # a chunk of quarantined rows has no table
+                start += len(chunk)
+                continue
+            table = getattr(batch, method)(**kwargs)
+            table.index = batch.input_rows
+            start += len(chunk)
+            yield table
+
+    @classmethod
+    def stream(
+        cls,
+        path,
+        sink,
+        chunksize=CHUNKSIZE,
+        method="create_table",
+        options=None,
+        **kwargs
+    ):
+        """
+        Creates a table chunk by chunk and writes each chunk to sink as soon
+            as it is calculated. See iter_tables() for the other arguments.
+
+        sink: file path of the output csv, Parquet, Feather or Arrow file, or
+            a function that is called with the table of each chunk. Parquet,
+            Feather and Arrow files are written without the index, and with
+            compact tables, in types wide enough for the values of every
+            chunk.
+
+        Returns:
+            rows: number of rows written to sink
+        """
+        tables = cls.iter_tables(path, chunksize, method, options, **kwargs)
+        rows = 0
+        if columnar.file_format(sink) is not None:
+            with columnar.TableWriter(sink) as writer:
+                for table in tables:
+                    writer.write(table)
+            return writer.rows
+        for table in tables:
+            if callable(sink):
+                sink(table)
+            else:
+                # the header is only written with the first chunk
+                table.to_csv(sink, mode="a" if rows else "w", header=not rows)
+            rows += len(table)
+        return rows
 
     def create_table(
         self,
@@ -142,6 +687,8 @@ class Batch:
         be_sub=0,
         be_inc=0,
         be_cg=0,
+        n_jobs=1,
+        compact=None,
     ):
         """
         Creates table of liabilities. Default is current law with no behavioral response
@@ -170,19 +717,59 @@ class Batch:
             of long-term capital gains divided by change in marginal tax rate (MTR) on
             long-term capital gains caused by the reform.  Must be zero or negative.
 
+        n_jobs: number of worker processes the input rows are split across. The
+            default of 1 runs in this process; -1 uses all CPUs.
+
+        compact: return the table in compact types, see compact_table(). The
+            default is the compact argument of the Batch.
+
         Returns:
             df_res: a Pandas dataframe. Each observation is a separate tax filer
         """
-        year = self.invar["FLPDYR"][0]
-        year = int(year.item())
-        recs = tc.Records(
-            data=self.invar,
-            start_year=year,
-            gfactors=None,
-            weights=None,
-            adjust_ratios=None,
+        if compact is None:
+            compact = self.compact
+        # incremental runs are looked up by input file, see update_table()
+        if self.incremental:
+            return self.update_table(
+                "create_table",
+                n_jobs,
+                compact,
+                reform_file=reform_file,
+                tc_vars=tc_vars,
+                tc_labels=tc_labels,
+                include_mtr=include_mtr,
+                be_sub=be_sub,
+                be_inc=be_inc,
+                be_cg=be_cg,
+            )
+        key = self.result_key(
+            "create_table",
+            reform_file=reform_file,
+            tc_vars=tc_vars,
+            tc_labels=tc_labels,
+            include_mtr=include_mtr,
+            be_sub=be_sub,
+            be_inc=be_inc,
+            be_cg=be_cg,
+            compact=compact,
         )
-
+        df_res = self.cached(key)
+        if df_res is not None:
+            return df_res
+        if self.jobs(n_jobs) > 1:
+            df_res = self.run_parallel(
+                "create_table",
+                n_jobs,
+                compact,
+                reform_file=reform_file,
+                tc_vars=tc_vars,
+                tc_labels=tc_labels,
+                include_mtr=include_mtr,
+                be_sub=be_sub,
+                be_inc=be_inc,
+                be_cg=be_cg,
+            )
+            return self.store(key, df_res)
         # if tc_vars and tc_labels are not specified, defaults are used
         if tc_vars is None:
             tc_vars = self.TC_VARS
@@ -194,23 +781,36 @@ class Batch:
 
         # if no reform file is passed, table will show current law values
         if reform_file is None:
-            pol = tc.Policy()
             assert be_sub == be_inc == be_cg == 0
-            calc = tc.Calculator(policy=pol, records=recs)
-            calc.advance_to_year(year)
-            calc.calc_all()
-            calcs = calc.dataframe(tc_vars)
+        # without behavioral responses behresp would only recalculate copies
+        # of the reform Calculators, so the static values are used as they
+        # are, unless the table has behresp's mtr_combined output
+        static = be_sub == be_inc == be_cg == 0
+        if reform_file is None or (static and "mtr_combined" not in tc_vars):
+            calcs = self.gather(
+                [
+                    (rows, calc.dataframe(tc_vars))
+                    for rows, calc in self.scenario(reform_file)
+                ]
+            )
         # if a reform file is passed, table will show reform values
         else:
-            pol = self.get_pol(reform_file)
-            calc = tc.Calculator(policy=pol, records=recs)
-            pol_base = tc.Policy()
-            calc_base = tc.Calculator(policy=pol_base, records=recs)
+            # behresp is only imported when it is needed
+            import behresp as br
+
             response_elasticities = {"sub": be_sub, "inc": be_inc, "cg": be_cg}
-            _, df2br = br.response(
-                calc_base, calc, response_elasticities, dump=True
-            )
-            calcs = df2br[tc_vars]
+            # the full dump is only needed for variables that are not in the
+            # distribution variables behresp returns by default
+            dump = not set(tc_vars) <= set(tc.DIST_VARIABLES)
+            frames = []
+            for rows, calc_base, calc in self.response_calcs(reform_file):
+                _, df2br = br.response(
+                    calc_base, calc, response_elasticities, dump=dump
+                )
+                frames.append((rows, df2br[tc_vars]))
+                # free the full output before the next chunk is calculated
+                del df2br
+            calcs = self.gather(frames)
 
         # if include_mtr is True, the tables includes three columns with MTRs
         if include_mtr:
@@ -219,13 +819,15 @@ class Batch:
             df_res = pd.concat([calcs, mtr_df], axis=1)
             col_labels = tc_labels + self.MTR_LABELS
             df_res.columns = col_labels
-            df_res.index = range(self.rows)
         else:
             df_res = calcs
             df_res.columns = tc_labels
-            df_res.index = range(self.rows)
+        df_res = self.scatter(df_res, tc_vars)
+        df_res.index = range(self.rows)
 
-        return df_res
+        if compact:
+            df_res = compact_table(df_res)
+        return self.store(key, df_res)
 
     def create_diff_table(
         self,
@@ -237,6 +839,8 @@ class Batch:
         be_sub=0,
         be_inc=0,
         be_cg=0,
+        n_jobs=1,
+        compact=None,
     ):
         """
         Creates a table that displays differences between baseline and reform. See the above
@@ -246,26 +850,97 @@ class Batch:
             responses must remain 0.
 
         """
+        if compact is None:
+            compact = self.compact
+        # incremental runs are looked up by input file, see update_table()
+        if self.incremental:
+            return self.update_table(
+                "create_diff_table",
+                n_jobs,
+                compact,
+                reform_file=reform_file,
+                tc_vars=tc_vars,
+                tc_labels=tc_labels,
+                include_mtr=include_mtr,
+                baseline=baseline,
+                be_sub=be_sub,
+                be_inc=be_inc,
+                be_cg=be_cg,
+            )
+        key = self.result_key(
+            "create_diff_table",
+            reform_file=reform_file,
+            tc_vars=tc_vars,
+            tc_labels=tc_labels,
+            include_mtr=include_mtr,
+            baseline=baseline,
+            be_sub=be_sub,
+            be_inc=be_inc,
+            be_cg=be_cg,
+            compact=compact,
+        )
+        df_diff_id = self.cached(key)
+        if df_diff_id is not None:
+            return df_diff_id
+        if self.jobs(n_jobs) > 1:
+            df_diff_id = self.run_parallel(
+                "create_diff_table",
+                n_jobs,
+                compact,
+                reform_file=reform_file,
+                tc_vars=tc_vars,
+                tc_labels=tc_labels,
+                include_mtr=include_mtr,
+                baseline=baseline,
+                be_sub=be_sub,
+                be_inc=be_inc,
+                be_cg=be_cg,
+            )
+            return self.store(key, df_diff_id)
         if tc_vars is None:
             tc_vars = self.TC_VARS
 
         if tc_labels is None:
             tc_labels = self.TC_LABELS
 
+        # differences are taken between full precision tables
         if baseline is None:
             t_base = self.create_table(
-                tc_vars=tc_vars, tc_labels=tc_labels, include_mtr=include_mtr
+                tc_vars=tc_vars,
+                tc_labels=tc_labels,
+                include_mtr=include_mtr,
+                compact=False,
             )
         else:
             # a behavioral response can only be simulated if the baseline is
             # current law
             assert be_sub == be_inc == be_cg == 0
             t_base = self.create_table(
-                baseline, tc_vars, tc_labels, include_mtr
+                baseline, tc_vars, tc_labels, include_mtr, compact=False
             )
         t_reform = self.create_table(
-            reform_file, tc_vars, tc_labels, include_mtr, be_sub, be_inc, be_cg
+            reform_file,
+            tc_vars,
+            tc_labels,
+            include_mtr,
+            be_sub,
+            be_inc,
+            be_cg,
+            compact=False,
         )
+        df_diff_id = self.diff(t_reform, t_base)
+        if compact:
+            df_diff_id = compact_table(df_diff_id)
+        return self.store(key, df_diff_id)
+
+    def diff(self, t_reform, t_base):
+        """
+        Subtracts a baseline table from a reform table with the same columns
+
+        Returns:
+            df_diff_id: a Pandas dataframe with the ID column and one
+                difference column per column of the tables
+        """
         df_all = pd.merge(t_reform, t_base, on="ID")
         df_ids = df_all["ID"]
         cols = len(t_base.columns)
@@ -274,12 +949,7 @@ class Batch:
         # new column labels that have "Diff" at the end
         diff_labels = ["ID"]
 
-        if include_mtr:
-            col_labels = tc_labels + self.MTR_LABELS
-        else:
-            col_labels = tc_labels
-
-        for label in col_labels:
+        for label in t_base.columns:
             if label == "ID":
                 pass
             else:
@@ -287,83 +957,608 @@ class Batch:
         df_diff_id.columns = diff_labels
         return df_diff_id
 
-    def get_pol(self, reform_file):
+    def compare(
+        self,
+        reform_files,
+        tc_vars=None,
+        tc_labels=None,
+        include_mtr=True,
+        baseline=None,
+        be_sub=0,
+        be_inc=0,
+        be_cg=0,
+        names=None,
+        wide=False,
+        n_jobs=1,
+        compact=None,
+    ):
         """
-        Reads the specified reform and implements it
+        Creates difference tables for several reforms against one baseline.
+            The baseline is calculated once and shared by every reform, and
+            the calculations of each reform are freed once its table is
+            made. See the create_table() docstring for a discussion on the
+            other arguments.
+
+        reform_files: list of reforms as accepted by create_table()
+
+        names: list of labels for the reforms. The default is the reform
+            itself for file paths and preset names and its position in
+            reform_files otherwise.
+
+        wide: if True, return one column per reform and table column instead
+            of one row per reform and filer
+
+        n_jobs: number of worker processes the reforms are split across. The
+            baseline table is still calculated once, in this process, but
+            with behavioral responses every worker also calculates the
+            current law Calculators that behresp needs for its reforms.
+
+        compact: see create_table()
+
+        Returns:
+            df_comp: a Pandas dataframe. By default it is the difference tables
+                of all reforms stacked, with a "Reform" column in front. If
+                wide is True, it is indexed by ID and has (reform, label)
+                column pairs.
         """
+        if compact is None:
+            compact = self.compact
+        key = self.result_key(
+            "compare",
+            reform_files=reform_files,
+            tc_vars=tc_vars,
+            tc_labels=tc_labels,
+            include_mtr=include_mtr,
+            baseline=baseline,
+            be_sub=be_sub,
+            be_inc=be_inc,
+            be_cg=be_cg,
+            names=names,
+            wide=wide,
+            compact=compact,
+        )
+        df_comp = self.cached(key)
+        if df_comp is not None:
+            return df_comp
+        if tc_vars is None:
+            tc_vars = self.TC_VARS
+        if tc_labels is None:
+            tc_labels = self.TC_LABELS
+        if names is None:
+            names = [
+                reform if isinstance(reform, str) else i
+                for i, reform in enumerate(reform_files)
+            ]
+        assert len(names) == len(reform_files)
+        if baseline is not None:
+            # a behavioral response can only be simulated if the baseline is
+            # current law
+            assert be_sub == be_inc == be_cg == 0
 
-        REFORMS_URL = (
-            "https://raw.githubusercontent.com/"
-            "PSLmodels/Tax-Calculator/master/taxcalc/reforms/"
+        t_base = self.create_table(
+            baseline, tc_vars, tc_labels, include_mtr, compact=False
         )
+        kwargs = [
+            dict(
+                reform_file=reform,
+                tc_vars=tc_vars,
+                tc_labels=tc_labels,
+                include_mtr=include_mtr,
+                be_sub=be_sub,
+                be_inc=be_inc,
+                be_cg=be_cg,
+                compact=False,
+            )
+            for reform in reform_files
+        ]
+        n_jobs = min(os.cpu_count() if n_jobs == -1 else n_jobs, len(names))
+        if n_jobs > 1:
+            pool = get_pool(n_jobs)
+            futures = [
+                pool.submit(
+                    _run_shard, self.ivar, self.options, "create_table", kw
+                )
+                for kw in kwargs
+            ]
+            t_reforms = [future.result() for future in futures]
+        else:
+            t_reforms = []
+            # only the baseline scenarios are kept
+            keep = set(self.scenarios)
+            for kw in kwargs:
+                t_reforms.append(self.create_table(**kw))
+                for scenario in set(self.scenarios) - keep:
+                    del self.scenarios[scenario]
+        diffs = [self.diff(t_reform, t_base) for t_reform in t_reforms]
 
-        # check to see if file path to reform_file exists
-        if isinstance(reform_file, str) and os.path.isfile(reform_file):
-            pol = tc.Policy()
-            pol.implement_reform(tc.Policy.read_json_reform(reform_file))
-        # try reform_file as dictionary
-        elif isinstance(reform_file, dict):
-            pol = tc.Policy()
-            try:
-                pol.implement_reform(reform_file)
-            except:
-                # use adjust method for web app
-                pol.adjust(reform_file)
-        # if file path does not exist, check Tax-Calculator reforms file
+        if wide:
+            df_comp = pd.concat(
+                [diff.drop(columns="ID") for diff in diffs], axis=1, keys=names
+            )
+            df_comp.index = diffs[0]["ID"]
+            df_comp.columns.names = ["Reform", None]
         else:
-            try:
-                reform_url = REFORMS_URL + reform_file
-                pol = tc.Policy()
-                pol.implement_reform(tc.Policy.read_json_reform(reform_url))
-            except:
-                raise "Reform file does not exist"
-        return pol
+            df_comp = pd.concat(diffs, keys=names, names=["Reform", None])
+            df_comp = df_comp.reset_index(level="Reform").reset_index(
+                drop=True
+            )
+        if compact:
+            df_comp = compact_table(df_comp)
+        return self.store(key, df_comp)
 
-    def calc_mtr(self, reform_file):
+    def result_key(self, method, incremental=False, **kwargs):
         """
-        Calculates income tax, payroll tax, and combined marginal rates
+        Returns the result cache key of a table, or None if the Batch has no
+            result cache
+
+        method: name of the method that creates the table
+
+        incremental: return the key of the last run on the same input file,
+            or with the same run name, whatever the inputs were, see
+            update_table()
+
+        kwargs: arguments of the method that the table depends on
         """
-        year = self.invar["FLPDYR"][0]
-        year = int(year.item())
-        recs_base = tc.Records(
-            data=self.invar,
-            start_year=year,
-            gfactors=None,
-            weights=None,
-            adjust_ratios=None,
+        if self.cache is None:
+            return None
+        if incremental:
+            if self.incremental is True:
+                source = os.path.abspath(self.path)
+            else:
+                source = self.incremental
+            inputs = ["incremental", source]
+        else:
+            inputs = self.input_key
+        for name in ("reform_file", "baseline"):
+            if name in kwargs:
+                kwargs[name] = reforms.reform_key(kwargs[name])
+        if "reform_files" in kwargs:
+            kwargs["reform_files"] = [
+                reforms.reform_key(reform) for reform in kwargs["reform_files"]
+            ]
+        return self.cache.key(
+            inputs,
+            method,
+            kwargs,
+            self.mtr_options,
+            self.finite_diff,
+            versions(),
         )
-        if reform_file is None:
-            pol = tc.Policy()
+
+    def update_table(self, method, n_jobs, compact, **kwargs):
+        """
+        Creates a table from the stored table of the last run on the same
+            input file or with the same run name. Rows are matched by RECID;
+            rows that are new or whose inputs changed are calculated in a Batch of their own and spliced
+            into the stored table, which is then replaced with the new one.
+            Every row is calculated independently of the others, so the
+            table is identical to one calculated from scratch.
+
+        method: "create_table" or "create_diff_table"
+
+        n_jobs: number of worker processes for the changed rows
+
+        compact: return the table in compact types
+
+        kwargs: arguments of method
+
+        Returns:
+            table: a Pandas dataframe
+        """
+        recids = self.ivar.iloc[:, 0].to_numpy()
+        if not pd.Index(recids).is_unique:
+            raise ValueError("incremental requires unique RECIDs")
+        run_key = self.result_key(method, incremental=True, **kwargs)
+        prior = self.cached(run_key)
+        if prior is None:
+            pos = np.full(self.rows, -1)
+            prior_rows = 0
+            reuse = np.zeros(self.rows, dtype=bool)
         else:
-            pol = self.get_pol(reform_file)
+            pos = pd.Index(prior["recids"]).get_indexer(recids)
+            prior_rows = len(prior["recids"])
+            reuse = pos >= 0
+            reuse[reuse] = (
+                prior["hashes"][pos[reuse]] == self.row_hashes[reuse]
+            )
+        changed = np.flatnonzero(~reuse)
+
+        if len(changed) == 0:
+            table = prior["table"].iloc[pos].reset_index(drop=True)
+        else:
+            # only the changed rows go through translate, Records and calc_all
+            subset = Batch(
+                self.ivar.iloc[changed].reset_index(drop=True), **self.options
+            )
+            new = getattr(subset, method)(
+                n_jobs=n_jobs, compact=False, **kwargs
+            )
+            if prior is None:
+                table = new
+            else:
+                # stored rows come first, followed by the new ones
+                order = pos.copy()
+                order[changed] = prior_rows + np.arange(len(changed))
+                table = pd.concat([prior["table"], new], ignore_index=True)
+                table = table.iloc[order].reset_index(drop=True)
+        # the stored run only needs to be replaced if the inputs changed
+        same = (
+            prior is not None
+            and len(changed) == 0
+            and prior_rows == self.rows
+            and (pos == np.arange(self.rows)).all()
+        )
+        if not same:
+            self.store(
+                run_key,
+                {"recids": recids, "hashes": self.row_hashes, "table": table},
+            )
+
+        matched = int((pos >= 0).sum())
+        reused = int(reuse.sum())
+        self.metadata["incremental"] = {
+            "added": self.rows - matched,
+            "changed": matched - reused,
+            "removed": prior_rows - matched,
+            "reused": reused,
+        }
+        if compact:
+            table = compact_table(table)
+        return table
+
+    def cached(self, key):
+        """
+        Returns the table stored in the result cache under key, or None
+        """
+        if key is None:
+            return None
+        return self.cache.get(key)
+
+    def store(self, key, table):
+        """
+        Stores table in the result cache under key and returns it
+        """
+        if key is not None:
+            self.cache.put(key, table)
+        return table
+
+    def jobs(self, n_jobs):
+        """
+        Returns the number of worker processes to use for n_jobs, which is
+            never more than the number of input rows
+        """
+        if n_jobs == -1:
+            n_jobs = os.cpu_count()
+        assert n_jobs >= 1
+        return min(n_jobs, self.rows)
+
+    def run_parallel(self, method, n_jobs, compact=None, **kwargs):
+        """
+        Splits the input rows into contiguous shards, runs method on each
+            shard in a pool of worker processes and stitches the tables back
+            together in input order. Every row is calculated exactly as in
+            serial mode, so the result is identical.
+
+        method: "create_table" or "create_diff_table"
+
+        n_jobs: number of worker processes
+
+        compact: see create_table(). Shards are stitched together at full
+            precision and the table is compacted once.
+
+        kwargs: arguments passed to method for every shard
+
+        Returns:
+            df_res: a Pandas dataframe. Each observation is a separate tax filer
+        """
+        n_jobs = self.jobs(n_jobs)
+        shards = np.array_split(np.arange(self.rows), n_jobs)
+        pool = get_pool(n_jobs)
+        futures = [
+            pool.submit(
+                _run_shard,
+                self.ivar.iloc[shard].reset_index(drop=True),
+                self.options,
+                method,
+                dict(kwargs, compact=False),
+            )
+            for shard in shards
+        ]
+        # shards are merged in submission order, so rows keep their position
+        # whatever order the workers finish in
+        df_res = pd.concat([future.result() for future in futures])
+        df_res.index = range(self.rows)
+        if self.compact if compact is None else compact:
+            df_res = compact_table(df_res)
+        return df_res
+
+    def memory_estimate(self, tc_vars=None, include_mtr=True, reform=False):
+        """
+        Estimates the memory create_table() needs before running it. The
+            estimate counts the inputs, the Records and Calculators kept in
+            self.scenarios and the table; behresp's temporary copies of the
+            Calculators are not counted.
+
+        tc_vars: list of Tax-Calculator output variables
+
+        include_mtr: include MTR calculations in the table
 
-        calc_base = tc.Calculator(policy=pol, records=recs_base)
-        calc_base.advance_to_year(year)
-        calc_base.calc_all()
-        payrolltax_base = calc_base.array("payrolltax")
-        incometax_base = calc_base.array("iitax")
+        reform: True if the table is for a reform with behavioral responses
+
+        Returns:
+            estimate: dictionary with the bytes needed for "inputs",
+                "records", "calculators" and "table", and their "total"
+        """
+        if tc_vars is None:
+            tc_vars = self.TC_VARS
+        rows = self.rows
+        # duplicate households are calculated once
+        calc_rows = len(self.invar.index)
+        mtr_rows = calc_rows * len(self.mtr_options) if include_mtr else 0
+        # behavioral responses also need the current law baseline
+        level_calcs = 2 if reform else 1
+        columns = len(tc_vars)
+        if include_mtr:
+            columns += len(self.MTR_LABELS)
+        estimate = {
+            "inputs": sum(
+                df.memory_usage(deep=True).sum()
+                for df in (self.ivar, self.invar, self.invar_marg)
+            ),
+            "records": records_row_bytes() * (calc_rows + mtr_rows),
+            "calculators": records_row_bytes()
+            * (calc_rows * level_calcs + mtr_rows),
+            # compact tables need at most this much
+            "table": rows * columns * 8,
+        }
+        estimate = {key: int(value) for key, value in estimate.items()}
+        estimate["total"] = sum(estimate.values())
+        return estimate
+
+    def get_pol(self, reform_file, year=None):
+        """
+        Reads the specified reform and implements it
+
+        reform_file: name of a reform file in the Tax-Calculator reforms folder,
+            a file path to a custom JSON reform file, a dictionary with a policy
+            reform, or None for current law.
+
+        year: year to set the returned Policy object to
+
+        Returns:
+            pol: a copy of the Tax-Calculator Policy object from the shared
+                Policy cache
+        """
+        return reforms.get_policy(reform_file, year)
+
+    def first_year(self):
+        """
+        Returns the earliest tax year in the input data
+        """
+        return int(self.invar["FLPDYR"].min())
+
+    def year_groups(self, invar):
+        """
+        Splits Tax-Calculator style inputs by tax year
+
+        Returns:
+            groups: list of (year, rows, data) tuples in order of year, where
+                rows are the positions of the year's observations in invar
+        """
+        years = invar["FLPDYR"].to_numpy()
+        groups = []
+        for year in np.unique(years):
+            rows = np.flatnonzero(years == year)
+            if len(rows) == len(invar):
+                data = invar
+            else:
+                data = invar.iloc[rows].reset_index(drop=True)
+            groups.append((int(year), rows, data))
+        return groups
+
+    def make_records(self, perturbation=None):
+        """
+        Creates one Tax-Calculator Records object per tax year in the input
+            data. Records are memoized in self.recs and shared by every
+            policy, since Calculator objects work on their own copy.
+
+        perturbation: None for the inputs as given or "mtr" for the stacked
+            copies of the inputs with finite_diff added to the income type of
+            each MTR option
+
+        Returns:
+            recs: list of (year, rows, Records) tuples, see year_groups()
+        """
+        recs = self.recs.get(perturbation)
+        if recs is None:
+            invar = self.invar if perturbation is None else self.invar_marg
+            recs = [
+                (
+                    year,
+                    rows,
+                    tc.Records(
+                        data=data,
+                        start_year=year,
+                        gfactors=None,
+                        weights=None,
+                        adjust_ratios=None,
+                    ),
+                )
+                for year, rows, data in self.year_groups(invar)
+            ]
+            self.recs[perturbation] = recs
+        return recs
+
+    def scenario(self, reform_file, perturbation=None):
+        """
+        Returns Calculators that have run calc_all for a policy and input
+            perturbation, one per tax year. Each scenario is calculated once
+            and memoized in self.scenarios, so create_table, calc_mtr and
+            create_diff_table share the passes they have in common. Every
+            Calculator starts from the same Policy object, which is advanced
+            to the year of its data.
+
+        reform_file: reform as accepted by get_pol(), or None for current law
+
+        perturbation: see make_records()
+
+        Returns:
+            calcs: list of (rows, Calculator) tuples
+        """
+        key = (reforms.reform_key(reform_file), perturbation)
+        calcs = self.scenarios.get(key)
+        if calcs is None:
+            pol = self.get_pol(reform_file, self.first_year())
+            calcs = []
+            for year, rows, recs in self.make_records(perturbation):
+                calc = tc.Calculator(policy=pol, records=recs)
+                calc.advance_to_year(year)
+                calc.calc_all()
+                calcs.append((rows, calc))
+            self.scenarios[key] = calcs
+        return calcs
+
+    def response_calcs(self, reform_file, chunksize=None):
+        """
+        Returns the baseline and reform Calculators for behresp. If no tax
+            year has more than chunksize rows, these are the shared scenario
+            Calculators, which br.response leaves as they are since it works
+            on copies. Otherwise each year is split into chunks of rows with
+            Calculators of their own that are not kept, so behresp's copies
+            and output are never larger than a chunk.
+
+        reform_file: reform as accepted by get_pol()
+
+        chunksize: maximum number of rows per chunk, RESPONSE_CHUNKSIZE by
+            default
+
+        Returns:
+            calcs: generator of (rows, baseline Calculator, reform Calculator)
+                tuples
+        """
+        if chunksize is None:
+            chunksize = RESPONSE_CHUNKSIZE
+        groups = self.year_groups(self.invar)
+        if all(len(rows) <= chunksize for _, rows, _ in groups):
+            for (rows, calc_base), (_, calc) in zip(
+                self.scenario(None), self.scenario(reform_file)
+            ):
+                yield rows, calc_base, calc
+            return
+        policies = [
+            self.get_pol(policy, self.first_year())
+            for policy in (None, reform_file)
+        ]
+        for year, rows, data in groups:
+            for start in range(0, len(rows), chunksize):
+                chunk = data.iloc[start : start + chunksize]
+                recs = tc.Records(
+                    data=chunk.reset_index(drop=True),
+                    start_year=year,
+                    gfactors=None,
+                    weights=None,
+                    adjust_ratios=None,
+                )
+                calcs = []
+                for pol in policies:
+                    # br.response runs calc_all on its copies
+                    calc = tc.Calculator(policy=pol, records=recs)
+                    calc.advance_to_year(year)
+                    calcs.append(calc)
+                yield (rows[start : start + chunksize], *calcs)
+
+    def clear_scenarios(self):
+        """
+        Frees the memoized Records and Calculators
+        """
+        self.recs = {}
+        self.scenarios = {}
+
+    def scatter(self, df, tc_vars):
+        """
+        Copies the results of each unique household to every input row it
+            stands for and restores the RECIDs of the input rows
+
+        df: table with one observation per unique household
+
+        tc_vars: Tax-Calculator variables of the first columns of df
+
+        Returns:
+            a Pandas dataframe with one observation per input row
+        """
+        if self.inverse is None:
+            return df
+        df = df.iloc[self.inverse].reset_index(drop=True)
+        if "RECID" in tc_vars:
+            col = list(tc_vars).index("RECID")
+            df.isetitem(col, self.recids.astype(df.dtypes.iloc[col]))
+        return df
+
+    def gather(self, frames):
+        """
+        Puts per-year dataframes back into the original row order
+
+        frames: list of (rows, dataframe) tuples
+
+        Returns:
+            a Pandas dataframe with one observation per input row
+        """
+        if len(frames) == 1:
+            return frames[0][1]
+        for rows, df in frames:
+            df.index = rows
+        return pd.concat([df for _, df in frames]).sort_index()
+
+    def gather_array(self, calcs, var):
+        """
+        Returns the values of var from per-year Calculators in the original
+            row order
+
+        calcs: list of (rows, Calculator) tuples
+        """
+        if len(calcs) == 1:
+            return calcs[0][1].array(var)
+        values = np.empty(sum(len(rows) for rows, _ in calcs))
+        for rows, calc in calcs:
+            values[rows] = calc.array(var)
+        return values
+
+    def calc_mtr(self, reform_file):
+        """
+        Calculates income tax, payroll tax, and combined marginal rates for
+            each of the mtr_options from one stacked calculation
+
+        Returns:
+            mtrs: tuple of arrays, three per MTR option in the order of
+                self.MTR_LABELS. Spouse earnings MTRs are NaN for filers that
+                are not married.
+        """
+        calcs_base = self.scenario(reform_file)
+        payrolltax_base = self.gather_array(calcs_base, "payrolltax")
+        incometax_base = self.gather_array(calcs_base, "iitax")
         combined_taxes_base = incometax_base + payrolltax_base
 
-        recs_marg = tc.Records(
-            data=self.invar_marg,
-            start_year=year,
-            gfactors=None,
-            weights=None,
-            adjust_ratios=None,
-        )
-        calc_marg = tc.Calculator(policy=pol, records=recs_marg)
-        calc_marg.advance_to_year(year)
-        calc_marg.calc_all()
-        payrolltax_marg = calc_marg.array("payrolltax")
-        incometax_marg = calc_marg.array("iitax")
+        # one row of values per MTR option
+        shape = (len(self.mtr_options), len(self.invar.index))
+        calcs_marg = self.scenario(reform_file, "mtr")
+        payrolltax_marg = self.gather_array(calcs_marg, "payrolltax")
+        payrolltax_marg = payrolltax_marg.reshape(shape)
+        incometax_marg = self.gather_array(calcs_marg, "iitax").reshape(shape)
         combined_taxes_marg = incometax_marg + payrolltax_marg
 
         payrolltax_diff = payrolltax_marg - payrolltax_base
         incometax_diff = incometax_marg - incometax_base
         combined_diff = combined_taxes_marg - combined_taxes_base
 
-        mtr_payrolltax = payrolltax_diff / FINITE_DIFF
-        mtr_incometax = incometax_diff / FINITE_DIFF
-        mtr_combined = combined_diff / FINITE_DIFF
+        mtrs = []
+        for i, option in enumerate(self.mtr_options):
+            mtr_payrolltax = payrolltax_diff[i] / self.finite_diff
+            mtr_incometax = incometax_diff[i] / self.finite_diff
+            mtr_combined = combined_diff[i] / self.finite_diff
+            if MTR_OPTIONS[option][1] == "e00200s":
+                single = self.invar["MARS"].to_numpy() != 2
+                for mtr in (mtr_payrolltax, mtr_incometax, mtr_combined):
+                    mtr[single] = np.nan
+            mtrs += [mtr_payrolltax, mtr_incometax, mtr_combined]
 
-        return (mtr_payrolltax, mtr_incometax, mtr_combined)
+        return tuple(mtrs)
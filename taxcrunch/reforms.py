@@ -0,0 +1,431 @@
+import argparse
+import copy
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+import urllib.request
+from collections import OrderedDict
+from contextlib import contextmanager
+
+CURRENT_PATH = os.path.abspath(os.path.dirname(__file__))
+
+REFORMS_URL = (
+    "https://raw.githubusercontent.com/"
+    "PSLmodels/Tax-Calculator/master/taxcalc/reforms/"
+)
+
+# on-disk store of preset reforms; set TAXCRUNCH_OFFLINE=1 to never go
+# to REFORMS_URL for a preset that is not in the store
+REFORM_STORE = os.environ.get(
+    "TAXCRUNCH_REFORM_STORE",
+    os.path.join(os.path.expanduser("~"), ".cache", "taxcrunch", "reforms"),
+)
+OFFLINE = os.environ.get("TAXCRUNCH_OFFLINE", "").strip().lower() in (
+    "1",
+    "true",
+    "yes",
+    "on",
+)
+FETCH_TIMEOUT = 30
+# seconds after which a lock file is assumed to be left behind by a process
+# that died while holding it
+LOCK_TIMEOUT = 60
+
+POLICY_CACHE_SIZE = 16
+
+
+class ReformNotFoundError(FileNotFoundError):
+    """
+    Raised when a reform is neither a file nor an available preset reform
+    """
+
+
+def preset_reforms():
+    """
+    Returns the names of the preset reforms offered in defaults.json
+    """
+    with open(os.path.join(CURRENT_PATH, "defaults.json")) as f:
+        defaults = json.load(f)
+    choices = defaults["reform_options"]["validators"]["choice"]["choices"]
+    return [name for name in choices if name != "None"]
+
+
+def _digest(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _write_atomic(path, text):
+    """
+    Writes text to path so that readers never see a partial file
+    """
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+
+@contextmanager
+def _file_lock(path, timeout=LOCK_TIMEOUT):
+    """
+    Holds the lock file path while the block runs, so that processes that
+        share a directory take turns. A lock file older than timeout
+        seconds is removed.
+    """
+    while True:
+        try:
+            fd = os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+            break
+        except FileExistsError:
+            try:
+                if time.time() - os.path.getmtime(path) > timeout:
+                    os.remove(path)
+                    continue
+            except FileNotFoundError:
+                continue
+            time.sleep(0.01)
+    try:
+        yield
+    finally:
+        os.close(fd)
+        os.remove(path)
+
+
+class ReformStore:
+    """
+    Local, content-addressed store of preset reforms from the Tax-Calculator
+    reforms folder. Each reform is saved as objects/<sha256>.json and
+    index.json maps preset names to their hashes. The index and parsed
+    reforms are also kept in memory, so a preset is downloaded at most once
+    and read from disk at most once per process. index.json is only changed
+    while holding a lock file, so processes sharing the store do not lose
+    each other's entries.
+
+    Parameters
+    ----------
+    path: directory of the store
+
+    offline: if True, a preset reform that is not in the store raises
+        ReformNotFoundError instead of being downloaded from REFORMS_URL
+
+    """
+
+    def __init__(self, path=REFORM_STORE, offline=OFFLINE):
+        self.path = path
+        self.offline = offline
+        self._parsed = {}
+        self._index = None
+        self._lock = threading.Lock()
+
+    def _index_path(self):
+        return os.path.join(self.path, "index.json")
+
+    def _object_path(self, digest):
+        return os.path.join(self.path, "objects", digest + ".json")
+
+    def _read_index(self):
+        try:
+            with open(self._index_path()) as f:
+                self._index = json.load(f)
+        except FileNotFoundError:
+            self._index = {}
+        return self._index
+
+    def index(self):
+        """
+        Returns a dictionary that maps preset names to content hashes. The
+            index is read from disk on first use.
+        """
+        index = self._index
+        if index is None:
+            index = self._read_index()
+        return dict(index)
+
+    def add(self, name, text):
+        """
+        Saves the JSON reform text of preset name in the store
+
+        Returns:
+            digest: the content hash of text
+        """
+        digest = _digest(text)
+        with self._lock:
+            os.makedirs(
+                os.path.dirname(self._object_path(digest)), exist_ok=True
+            )
+            if not os.path.isfile(self._object_path(digest)):
+                _write_atomic(self._object_path(digest), text)
+            # other processes may have added presets since the index was
+            # read, so it is read again under the lock
+            with _file_lock(self._index_path() + ".lock"):
+                index = dict(self._read_index())
+                index[name] = digest
+                _write_atomic(
+                    self._index_path(),
+                    json.dumps(index, indent=4, sort_keys=True),
+                )
+            self._index = index
+        return digest
+
+    def fetch(self, name):
+        """
+        Downloads preset name from REFORMS_URL and saves it in the store
+
+        Returns:
+            digest: the content hash of the reform
+        """
+        if self.offline:
+            raise ReformNotFoundError(
+                "Reform {} is not in the reform store at {} and offline "
+                "mode is on".format(name, self.path)
+            )
+        try:
+            with urllib.request.urlopen(
+                REFORMS_URL + name, timeout=FETCH_TIMEOUT
+            ) as response:
+                text = response.read().decode("utf-8")
+        except OSError as err:
+            raise ReformNotFoundError(
+                "Reform {} is not a file or a preset reform that could be "
+                "downloaded from {}: {}".format(name, REFORMS_URL, err)
+            ) from err
+        return self.add(name, text)
+
+    def digest(self, name):
+        """
+        Returns the content hash of preset name, downloading it first if it
+            is not in the store
+        """
+        index = self._index
+        if index is None or name not in index:
+            # another process may have added the preset since the index
+            # was read
+            index = self._read_index()
+        digest = index.get(name)
+        if digest is None or not os.path.isfile(self._object_path(digest)):
+            digest = self.fetch(name)
+        return digest
+
+    def reform(self, name):
+        """
+        Returns the parsed reform dictionary for preset name
+        """
+        digest = self.digest(name)
+        reform = self._parsed.get(digest)
+        if reform is None:
+            with open(self._object_path(digest), encoding="utf-8") as f:
+                text = f.read()
+            if _digest(text) != digest:
+                raise ValueError(
+                    "Stored reform {} does not match its hash; run the "
+                    "prewarm command again".format(name)
+                )
+            import taxcalc as tc
+
+            reform = tc.Policy.read_json_reform(text)
+            self._parsed[digest] = reform
+        return copy.deepcopy(reform)
+
+    def prewarm(self, names=None):
+        """
+        Downloads preset reforms into the store, replacing stored versions.
+            The default is every preset reform offered in defaults.json.
+
+        Returns:
+            index: a dictionary that maps preset names to content hashes
+        """
+        if names is None:
+            names = preset_reforms()
+        return {name: self.fetch(name) for name in names}
+
+
+STORE = ReformStore()
+
+
+def reform_type(reform):
+    """
+    Classifies a reform specification
+
+    reform: None (current law), a file path to a JSON reform file, JSON
+        reform text, the name of a reform in the Tax-Calculator reforms
+        folder, or a dictionary with a policy reform.
+
+    Returns:
+        one of "current_law", "file", "json", "preset" or "dict"
+    """
+    if reform is None:
+        return "current_law"
+    if isinstance(reform, dict):
+        return "dict"
+    if isinstance(reform, str):
+        if os.path.isfile(reform):
+            return "file"
+        if reform.strip().startswith("{"):
+            return "json"
+        return "preset"
+    raise TypeError(
+        "reform must be None, a string or a dictionary, not {}".format(
+            type(reform).__name__
+        )
+    )
+
+
+def _canonical(obj):
+    """
+    Converts dictionary keys to strings so that e.g. {2018: 1} and
+    {"2018": 1} produce the same JSON text.
+    """
+    if isinstance(obj, dict):
+        return {str(k): _canonical(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return [_canonical(v) for v in obj]
+    return obj
+
+
+def reform_key(reform):
+    """
+    Creates a canonical hash of a reform specification. Reform files are
+    hashed by their contents, so editing a file changes its key.
+
+    Returns:
+        key: a string identifying the reform
+    """
+    kind = reform_type(reform)
+    if kind == "current_law":
+        return kind
+    if kind == "preset":
+        return "preset:" + STORE.digest(reform)
+    if kind == "file":
+        with open(reform, "rb") as f:
+            content = f.read()
+    elif kind == "json":
+        content = reform.encode("utf-8")
+    else:
+        content = json.dumps(
+            _canonical(reform), sort_keys=True, default=str
+        ).encode("utf-8")
+    return kind + ":" + hashlib.sha256(content).hexdigest()
+
+
+def build_policy(reform=None):
+    """
+    Creates a Tax-Calculator Policy object and implements the reform
+
+    Returns:
+        pol: Tax-Calculator Policy object
+    """
+    # Tax-Calculator is imported on first use to keep importing taxcrunch fast
+    import taxcalc as tc
+
+    kind = reform_type(reform)
+    pol = tc.Policy()
+    if kind == "dict":
+        try:
+            pol.implement_reform(reform)
+        except:
+            # use adjust method for web app
+            pol.adjust(reform)
+    elif kind == "preset":
+        pol.implement_reform(STORE.reform(reform))
+    elif kind != "current_law":
+        pol.implement_reform(tc.Policy.read_json_reform(reform))
+    return pol
+
+
+class PolicyCache:
+    """
+    Bounded, thread-safe LRU cache of fully built Policy objects, keyed by
+    the reform's canonical hash and the target year. Every lookup returns
+    an isolated copy, so callers are free to modify what they get back.
+
+    Parameters
+    ----------
+    maxsize: maximum number of Policy objects kept in the cache
+
+    """
+
+    def __init__(self, maxsize=POLICY_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._policies = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._policies)
+
+    def get(self, reform=None, year=None):
+        """
+        Returns a copy of the Policy object for reform, set to year if a
+            year is given. The Policy is built and cached on a miss.
+        """
+        key = (reform_key(reform), year)
+        with self._lock:
+            pol = self._policies.get(key)
+            if pol is not None:
+                self._policies.move_to_end(key)
+                self.hits += 1
+        if pol is None:
+            pol = build_policy(reform)
+            if year is not None:
+                pol.set_year(year)
+            with self._lock:
+                self.misses += 1
+                self._policies[key] = pol
+                self._policies.move_to_end(key)
+                while len(self._policies) > self.maxsize:
+                    self._policies.popitem(last=False)
+        return copy.deepcopy(pol)
+
+    def clear(self):
+        """
+        Removes all Policy objects from the cache
+        """
+        with self._lock:
+            self._policies.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+POLICY_CACHE = PolicyCache()
+
+
+def get_policy(reform=None, year=None):
+    """
+    Returns a copy of the Policy object for reform from the process-wide
+        Policy cache. See reform_type() for the accepted reform arguments.
+    """
+    return POLICY_CACHE.get(reform, year)
+
+
+def main(args=None):
+    """
+    Command line interface to pre-warm the reform store, e.g. before
+        copying it to machines without network access:
+
+        python -m taxcrunch.reforms prewarm [--store DIR] [NAME ...]
+    """
+    parser = argparse.ArgumentParser(
+        prog="python -m taxcrunch.reforms",
+        description="Download preset reforms into the local reform store",
+    )
+    parser.add_argument("command", choices=["prewarm"])
+    parser.add_argument(
+        "names",
+        nargs="*",
+        help="preset reform file names (default: all preset reforms)",
+    )
+    parser.add_argument(
+        "--store", default=REFORM_STORE, help="reform store directory"
+    )
+    args = parser.parse_args(args)
+    store = ReformStore(args.store, offline=False)
+    index = store.prewarm(args.names or None)
+    for name, digest in sorted(index.items()):
+        print("{}  {}".format(digest, name))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,136 @@
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+
+# on-disk cache of Batch tables; used when a Batch is created with cache=True
+RESULT_CACHE = os.environ.get(
+    "TAXCRUNCH_RESULT_CACHE",
+    os.path.join(os.path.expanduser("~"), ".cache", "taxcrunch", "results"),
+)
+# the least recently used tables are removed when the cache grows past this
+RESULT_CACHE_SIZE = 2**30
+
+
+class ResultCache:
+    """
+    Size-bounded on-disk cache of result tables. Each table is pickled to
+    <key>.pkl, where the key is a hash of everything the table depends on,
+    so stored tables never need to be invalidated. Reading a table marks it
+    as recently used; when the cache is larger than max_bytes, the least
+    recently used tables are removed.
+
+    Parameters
+    ----------
+    path: directory of the cache
+
+    max_bytes: maximum total size of the stored tables
+
+    """
+
+    def __init__(self, path=RESULT_CACHE, max_bytes=RESULT_CACHE_SIZE):
+        self.path = path
+        self.max_bytes = max_bytes
+
+    @staticmethod
+    def key(*parts):
+        """
+        Returns a hash of parts, which must be JSON serializable
+        """
+        text = json.dumps(parts, sort_keys=True, default=str)
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def _table_path(self, key):
+        return os.path.join(self.path, key + ".pkl")
+
+    def get(self, key):
+        """
+        Returns the table stored under key, or None if there is none or it
+            cannot be loaded, e.g. because it was stored with other versions
+            of pandas or numpy. Tables that cannot be loaded are removed.
+        """
+        path = self._table_path(key)
+        try:
+            with open(path, "rb") as f:
+                table = pickle.load(f)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            return None
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            pass
+        return table
+
+    def put(self, key, table):
+        """
+        Stores table under key and removes the least recently used tables
+            if the cache has grown past max_bytes
+        """
+        os.makedirs(self.path, exist_ok=True)
+        # write to a temporary file first so that readers never see a
+        # partial table
+        fd, tmp = tempfile.mkstemp(dir=self.path, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump(table, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, self._table_path(key))
+        self.evict()
+
+    def entries(self):
+        """
+        Returns (last used, size, path) for every stored table, least
+            recently used first
+        """
+        entries = []
+        try:
+            names = os.listdir(self.path)
+        except FileNotFoundError:
+            return entries
+        for name in names:
+            if not name.endswith(".pkl"):
+                continue
+            path = os.path.join(self.path, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        return sorted(entries)
+
+    def size(self):
+        """
+        Returns the total size of the stored tables in bytes
+        """
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self):
+        """
+        Removes the least recently used tables until the cache is no larger
+            than max_bytes
+        """
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def clear(self):
+        """
+        Removes every stored table
+        """
+        for _, _, path in self.entries():
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
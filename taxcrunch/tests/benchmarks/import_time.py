@@ -0,0 +1,58 @@
+"""
+Measures the wall time of importing taxcrunch and its public names in fresh
+Python interpreters.
+
+    python taxcrunch/tests/benchmarks/import_time.py [--runs N]
+
+Each statement is run in its own interpreter RUNS times and the median time
+is reported, along with whether Tax-Calculator was imported as a side effect.
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+
+STATEMENTS = [
+    "import taxcrunch",
+    "from taxcrunch import CruncherParams",
+    "from taxcrunch import Cruncher",
+    "from taxcrunch import Batch",
+]
+
+SCRIPT = """
+import sys, time
+start = time.perf_counter()
+{}
+print(time.perf_counter() - start, "taxcalc" in sys.modules)
+"""
+
+
+def time_import(statement, runs):
+    """
+    Returns the median import time in seconds and whether taxcalc was loaded
+    """
+    times = []
+    for _ in range(runs):
+        out = subprocess.run(
+            [sys.executable, "-c", SCRIPT.format(statement)],
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout.split()
+        times.append(float(out[0]))
+    return statistics.median(times), out[1] == "True"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+    print("{:<40} {:>10}  {}".format("statement", "median (s)", "taxcalc"))
+    for statement in STATEMENTS:
+        seconds, taxcalc = time_import(statement, args.runs)
+        print("{:<40} {:>10.3f}  {}".format(statement, seconds, taxcalc))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+import os
+import pytest
+import pandas as pd
+from taxcrunch import columnar
+from taxcrunch.multi_cruncher import Batch
+
+pa = pytest.importorskip("pyarrow")
+
+CURRENT_PATH = os.path.abspath(os.path.dirname(__file__))
+input_path = os.path.join(CURRENT_PATH, "example_test_input.csv")
+
+
+@pytest.mark.parametrize("ext", [".parquet", ".feather", ".arrow"])
+def test_columnar_input(tmpdir, ext):
+    ivar = pd.read_csv(input_path, header=None)
+    path = os.path.join(tmpdir, "input" + ext)
+    columnar.write_inputs(ivar, path)
+    ivar_read = columnar.read_inputs(path)
+    # values are stored with the types declared in defaults_batch.json
+    assert ivar_read[2].dtype == "int64"
+    assert ivar_read[9].dtype == "float64"
+    assert ivar_read.astype(float).equals(ivar.astype(float))
+
+    table = Batch(input_path).create_table()
+    assert Batch(path).create_table().equals(table)
+
+    # the table is streamed straight to a file of the same format
+    out_path = os.path.join(tmpdir, "output" + ext)
+    rows = Batch.stream(path, out_path, chunksize=3)
+    assert rows == len(table.index)
+    if ext == ".parquet":
+        streamed = pd.read_parquet(out_path)
+    else:
+        streamed = pd.read_feather(out_path)
+    assert streamed.equals(table)
+
+
+def test_input_projection(tmpdir):
+    """
+    Test that inputs are mapped to TAXSIM columns by position and that
+    columns after the first 28 are not read.
+    """
+    ivar = pd.read_csv(input_path, header=None)
+    named = ivar.copy()
+    named.columns = ["col{}".format(i) for i in range(28)]
+    named["note"] = "not an input"
+    path = os.path.join(tmpdir, "input.parquet")
+    columnar.write_table(named, path)
+    assert columnar.read_inputs(path).equals(ivar)
+    chunks = list(columnar.iter_inputs(path, 4))
+    assert [len(chunk.index) for chunk in chunks] == [4, 3]
+    assert pd.concat(chunks, ignore_index=True).equals(ivar)
+
+    # integer inputs must be whole numbers to be written with their type
+    ivar[2] = ivar[2] + 0.5
+    with pytest.raises(pa.ArrowInvalid):
+        columnar.write_inputs(ivar, os.path.join(tmpdir, "bad.parquet"))
+
+
+@pytest.mark.parametrize("ext", [".parquet", ".feather"])
+def test_compact_stream(tmpdir, ext):
+    table = Batch(input_path).create_table(include_mtr=False)
+    out_path = os.path.join(tmpdir, "output" + ext)
+    # the chunks of a compact table have different types, which are widened
+    # to one schema for the file
+    rows = Batch.stream(
+        input_path,
+        out_path,
+        chunksize=3,
+        options={"compact": True},
+        include_mtr=False,
+    )
+    assert rows == len(table.index)
+    if ext == ".parquet":
+        streamed = pd.read_parquet(out_path)
+    else:
+        streamed = pd.read_feather(out_path)
+    assert (streamed.astype(float) == table).all().all()
+    assert streamed.memory_usage().sum() < table.memory_usage().sum()
+    assert os.listdir(tmpdir) == ["output" + ext]
+
+
+def test_compressed_feather_chunks(tmpdir):
+    import pyarrow.feather as feather
+
+    ivar = pd.read_csv(input_path, header=None)
+    big = pd.concat([ivar] * 3000, ignore_index=True)
+    table = columnar.to_arrow(big, columnar.input_schema())
+    path = os.path.join(tmpdir, "input.feather")
+    feather.write_feather(table, path, compression="lz4", chunksize=1000)
+
+    # only the record batches of the first chunk are decompressed
+    allocated = pa.total_allocated_bytes()
+    chunks = columnar.iter_inputs(path, 700)
+    first = next(chunks)
+    assert pa.total_allocated_bytes() - allocated < table.nbytes / 4
+
+    # chunks are cut across record batches
+    chunks = [first] + list(chunks)
+    assert [len(chunk.index) for chunk in chunks] == [700] * 30
+    assert pd.concat(chunks, ignore_index=True).equals(
+        columnar.read_inputs(path)
+    )
@@ -4,6 +4,7 @@ import os
 import numpy as np
 import pandas as pd
 import taxcalc as tc
+from paramtools import ValidationError
 from taxcrunch import cruncher as cr
 
 CURR_PATH = os.path.abspath(os.path.dirname(__file__))
@@ -48,3 +49,156 @@ def test_mtr_table(cr_data):
     table = cr_data.mtr_table()
     assert isinstance(table, pd.DataFrame)
     assert abs(table.all(axis=None)) < 1
+
+
+def test_lazy_cruncher():
+    c = cr.Cruncher(inputs=no_reform_path, custom_reform=reform_path)
+    lazy = cr.Cruncher(
+        inputs=no_reform_path, custom_reform=reform_path, lazy=True
+    )
+    assert "calc1" not in vars(lazy)
+    assert lazy.basic_table().equals(c.basic_table())
+    # the basic table does not need the + $1 Calculator or detailed table
+    assert "calc_mtr" not in vars(lazy)
+    assert "df_calc" not in vars(lazy)
+    assert lazy.calc_table().equals(c.calc_table())
+
+
+def test_stacked_reform_calc():
+    c = cr.Cruncher(
+        inputs=no_reform_path, custom_reform=reform_path, lazy=True
+    )
+    # the reform and + $1 rows are calculated in one pass
+    assert c.calc_mtr is c.calc_reform
+    assert c.calc_reform.array_len == 2
+    wages = c.calc_reform.array("e00200p")
+    assert wages[c.row_mtr] == wages[c.row] + 1
+
+
+def test_mtr_table_from_stacked_calcs():
+    c = cr.Cruncher(
+        inputs=no_reform_path, custom_reform=reform_path, lazy=True
+    )
+    table = c.mtr_table()
+    assert np.allclose(table["Base"], [24.0, 15.3])
+    assert np.allclose(table["Reform"], [25.0, 15.3])
+    # MTRs come from the same + $1 rows as the detailed table
+    taxes = c.calc_reform.dataframe(["iitax"])["iitax"]
+    assert np.isclose(
+        table.loc["Income Tax Marginal Rate", "Reform"],
+        100 * (taxes[c.row_mtr] - taxes[c.row]),
+    )
+
+
+def test_mtr_matrix():
+    c = cr.Cruncher(
+        inputs=no_reform_path, custom_reform=reform_path, lazy=True
+    )
+    matrix = c.mtr_matrix()
+    assert list(matrix.index) == list(cr.MTR_OPTIONS)
+    # spouse earnings rates are missing for single filers
+    assert matrix.loc["Spouse Earnings"].isna().all()
+    assert np.allclose(
+        matrix.xs("Combined", axis=1, level=1),
+        matrix.xs("Income Tax", axis=1, level=1)
+        + matrix.xs("Payroll Tax", axis=1, level=1),
+        equal_nan=True,
+    )
+    earnings = matrix.loc["Taxpayer Earnings"]
+    mtr = c.mtr_table()
+    for col in ["Base", "Reform", "Change"]:
+        assert np.isclose(
+            earnings[col, "Income Tax"],
+            mtr.loc["Income Tax Marginal Rate", col],
+        )
+        assert np.isclose(
+            earnings[col, "Payroll Tax"],
+            mtr.loc["Payroll Tax Marginal Rate", col],
+        )
+
+    # matches the MTR table for another 'mtr_options' choice
+    with open(no_reform_path) as f:
+        adjustment = json.load(f)
+    adjustment["mtr_options"] = [{"value": "Long Term Gains"}]
+    c_ltcg = cr.Cruncher(
+        inputs=adjustment, custom_reform=reform_path, lazy=True
+    )
+    mtr_ltcg = c_ltcg.mtr_table()
+    assert np.allclose(
+        matrix.loc["Long Term Gains"].xs("Income Tax", level=1),
+        mtr_ltcg.loc["Income Tax Marginal Rate"],
+    )
+
+
+def test_many():
+    with open(no_reform_path) as f:
+        single = json.load(f)
+    joint = json.loads(json.dumps(single))
+    joint["mstat"] = [{"value": "Joint"}]
+    joint["swages"] = [{"value": 40000}]
+    joint["mtr_options"] = [{"value": "Spouse Earnings"}]
+    crunchers = cr.Cruncher.many([single, joint], custom_reform=reform_path)
+    assert len(crunchers) == 2
+    # both households are calculated in one Calculator per policy
+    assert crunchers[0].calc1 is crunchers[1].calc1
+    assert crunchers[0].calc_reform.array_len == 4
+    for adjustment, c_many in zip([single, joint], crunchers):
+        c = cr.Cruncher(inputs=adjustment, custom_reform=reform_path)
+        assert c_many.basic_table().equals(c.basic_table())
+        assert c_many.calc_table().equals(c.calc_table())
+
+    bad = json.loads(json.dumps(single))
+    bad["page"] = [{"value": -1}]
+    with pytest.raises(ValidationError) as err:
+        cr.Cruncher.many([single, bad, bad])
+    assert "household 1: page" in str(err.value)
+    assert "household 2: page" in str(err.value)
+
+
+def test_calc_results():
+    c = cr.Cruncher(
+        inputs=no_reform_path, custom_reform=reform_path, lazy=True
+    )
+    results = c.calc_results()
+    assert isinstance(results, cr.CruncherResults)
+    assert results.base.dtype == np.float64
+    assert np.allclose(results.change, results.reform - results.base)
+    # exports share the value arrays and only format() creates strings
+    res_dict = results.to_dict()
+    assert res_dict["Base"] is results.base
+    assert res_dict["labels"] == c.CALC_LABELS
+    res_json = json.loads(results.to_json())
+    assert np.allclose(res_json["+ $1 (Taxpayer Earnings)"], results.mtr)
+    assert results.format().equals(
+        results.to_frame().apply(lambda col: col.map("{:,.2f}".format))
+    )
+    assert c.calc_table().equals(
+        results.format(["Base", "Reform", "+ $1 (Taxpayer Earnings)"])
+    )
+    diff = c.calc_diff_table()
+    assert list(diff.columns) == ["Base", "Reform", "Change"]
+    assert diff["Change"].equals(results.format(["Change"])["Change"])
+    assert c.basic_results().to_frame().shape == (4, 3)
+
+
+def test_basic_table_rounding():
+    with open(no_reform_path) as f:
+        adjustment = json.load(f)
+    adjustment["pwages"] = [{"value": 9000}]
+    c = cr.Cruncher(inputs=adjustment, custom_reform=reform_path)
+    # the detailed table is not formatted until it is used
+    assert "df_calc" not in vars(c)
+
+    # liabilities are rounded to cents before they are formatted, as in
+    # basic_vals()
+    expected = pd.concat(
+        [
+            c.df_basic_vals.iloc[:1],
+            c.df_mtr.iloc[:1],
+            c.df_basic_vals.iloc[1:],
+            c.df_mtr.iloc[1:],
+        ]
+    ).apply(lambda col: col.map("{:,.2f}".format))
+    table = c.basic_table()
+    assert table.equals(expected)
+    assert table.loc["Individual Income Tax", "Base"] == "-502.22"
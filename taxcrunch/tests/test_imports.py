@@ -0,0 +1,52 @@
+import subprocess
+import sys
+
+
+def imported_modules(statement):
+    """
+    Returns the names of the modules imported by statement in a fresh
+    interpreter
+    """
+    script = "import sys\n{}\nprint(' '.join(sys.modules))".format(statement)
+    out = subprocess.run(
+        [sys.executable, "-c", script],
+        check=True,
+        capture_output=True,
+        text=True,
+    )
+    return set(out.stdout.split())
+
+
+def test_lazy_package_import():
+    modules = imported_modules("import taxcrunch")
+    for heavy in ["taxcalc", "behresp", "paramtools", "pandas"]:
+        assert heavy not in modules
+    assert "taxcrunch.cruncher" not in modules
+
+
+def test_params_import_skips_taxcalc():
+    modules = imported_modules(
+        "from taxcrunch import CruncherParams; CruncherParams()"
+    )
+    assert "paramtools" in modules
+    assert "taxcalc" not in modules
+
+
+def test_batch_import_skips_behresp():
+    modules = imported_modules("import taxcrunch; taxcrunch.Batch")
+    assert "taxcalc" in modules
+    assert "behresp" not in modules
+    assert "taxcrunch.cruncher" not in modules
+
+
+def test_submodule_attributes():
+    modules = imported_modules(
+        "import taxcrunch; taxcrunch.columnar.write_inputs"
+    )
+    assert "taxcrunch.columnar" in modules
+    assert "pyarrow" not in modules
+    modules = imported_modules(
+        "import taxcrunch; taxcrunch.result_cache.ResultCache"
+    )
+    assert "taxcrunch.result_cache" in modules
+    assert "taxcalc" not in modules
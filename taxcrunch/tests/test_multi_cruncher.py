@@ -6,6 +6,9 @@ import pandas as pd
 import taxcalc as tc
 import taxcrunch.cruncher as cr
 import taxcrunch.multi_cruncher as mcr
+from taxcrunch import reforms
+from taxcrunch.result_cache import ResultCache
+from paramtools import ValidationError
 
 CURRENT_PATH = os.path.abspath(os.path.dirname(__file__))
 
@@ -131,3 +134,395 @@ def test_qbid_params():
     assert np.allclose(
         table["Qualified Business Income Deduction"], expect_qbid
     )
+
+
+def test_stream(tmpdir, crunch=b):
+
+    table = b.create_table(reform_file=reform_dict)
+    out_path = os.path.join(tmpdir, "streamed.csv")
+    rows = mcr.Batch.stream(
+        input_path, out_path, chunksize=2, reform_file=reform_dict
+    )
+    assert rows == len(table.index)
+    streamed = pd.read_csv(out_path, index_col=0)
+    assert list(streamed.columns) == list(table.columns)
+    assert np.allclose(streamed, table)
+
+    chunks = []
+    mcr.Batch.stream(
+        input_path,
+        chunks.append,
+        chunksize=3,
+        method="create_diff_table",
+        reform_file=reform_dict,
+    )
+    assert pd.concat(chunks).equals(b.create_diff_table(reform_dict))
+
+
+def test_parallel(crunch=b):
+
+    table = b.create_table(reform_file=reform_dict, be_sub=0.25)
+    table_par = b.create_table(reform_file=reform_dict, be_sub=0.25, n_jobs=2)
+    assert table_par.equals(table)
+
+    diff = b.create_diff_table(reform_dict, include_mtr=False)
+    diff_par = b.create_diff_table(reform_dict, include_mtr=False, n_jobs=-1)
+    assert diff_par.equals(diff)
+    mcr.shutdown_pools()
+
+
+def test_multi_year():
+
+    ivar = pd.read_csv(input_path, header=None)
+    ivar.loc[[1, 3], 1] = 2022
+    table = mcr.Batch(ivar).create_table(reform_file=reform_dict)
+    assert len(table.index) == len(ivar.index)
+
+    # each row matches the result of a Batch with only that row's year
+    for year, rows in ivar.groupby(1).groups.items():
+        b_year = mcr.Batch(ivar.loc[rows].reset_index(drop=True))
+        expected = b_year.create_table(reform_file=reform_dict)
+        assert table.loc[rows].reset_index(drop=True).equals(expected)
+
+
+def test_validate_inputs(tmpdir):
+
+    ivar = pd.read_csv(input_path, header=None)
+    ivar.loc[1, 2] = 3
+    ivar.loc[4, 3] = 40.5
+    ivar.loc[4, 9] = -100
+    values, bad, errors = mcr.validate_inputs(ivar)
+    assert bad.tolist() == [False, True, False, False, True, False, False]
+    assert errors.row.tolist() == [1, 4, 4]
+    assert errors.param.tolist() == ["mstat", "page", "pwages"]
+
+    with pytest.raises(ValidationError):
+        mcr.Batch(ivar)
+
+    bad_path = os.path.join(tmpdir, "bad_rows.csv")
+    b_valid = mcr.Batch(ivar, quarantine=bad_path)
+    assert b_valid.rows == 5
+    table = b_valid.create_table(include_mtr=False)
+    assert table["ID"].tolist() == [1, 3, 4, 6, 7]
+    expected = b.create_table(include_mtr=False).iloc[[0, 2, 3, 5, 6]]
+    assert np.allclose(table, expected)
+
+    bad_rows = pd.read_csv(bad_path, header=None)
+    assert bad_rows[0].tolist() == [2, 5]
+    assert bad_rows[28].tolist() == [
+        "mstat > max 2",
+        "page not a valid integer; pwages < min 0",
+    ]
+
+
+def test_stream_quarantine(tmpdir):
+
+    ivar = pd.read_csv(input_path, header=None)
+    ivar.loc[2, 3] = -5
+    ivar.loc[6, 2] = 3
+    bad_path = os.path.join(tmpdir, "bad_rows.csv")
+    with open(bad_path, "w") as f:
+        f.write("left over from an earlier run\n")
+    tables = []
+    rows = mcr.Batch.stream(
+        ivar,
+        tables.append,
+        chunksize=3,
+        options={"quarantine": bad_path},
+        include_mtr=False,
+    )
+    assert rows == 5
+    # tables are indexed by input position, with gaps for invalid rows
+    table = pd.concat(tables)
+    assert table.index.tolist() == [0, 1, 3, 4, 5]
+    expected = b.create_table(include_mtr=False).iloc[[0, 1, 3, 4, 5]]
+    assert table.equals(expected)
+
+    # the invalid rows of every chunk are kept
+    bad_rows = pd.read_csv(bad_path, header=None)
+    assert bad_rows[0].tolist() == [3, 7]
+    assert bad_rows[28].tolist() == ["page < min 0", "mstat > max 2"]
+
+    # row numbers count from the start of the file
+    with pytest.raises(ValidationError, match="row 5"):
+        list(mcr.Batch.iter_tables(ivar.drop(index=2), chunksize=3))
+
+
+def test_shared_scenarios(monkeypatch):
+
+    b_shared = mcr.Batch(input_path)
+    table = b_shared.create_table(reform_file=reform_dict)
+    # a static reform table does not need the current law baseline
+    assert len(b_shared.scenarios) == 2
+    calcs = b_shared.scenario(reform_dict)
+
+    # calculations done for create_table are reused by create_diff_table
+    passes = []
+    calc_all = tc.Calculator.calc_all
+    monkeypatch.setattr(
+        tc.Calculator,
+        "calc_all",
+        lambda calc, *args: passes.append(calc) or calc_all(calc, *args),
+    )
+    diff = b_shared.create_diff_table(reform_file=reform_dict)
+    assert set(b_shared.scenarios) == {
+        ("current_law", None),
+        ("current_law", "mtr"),
+        (reforms.reform_key(reform_dict), None),
+        (reforms.reform_key(reform_dict), "mtr"),
+    }
+    assert b_shared.scenario(reform_dict) is calcs
+    # only the baseline passes
+    assert len(passes) == 2
+    assert diff.equals(b.create_diff_table(reform_file=reform_dict))
+    assert table.equals(b.create_table(reform_file=reform_dict))
+
+    b_shared.clear_scenarios()
+    assert b_shared.scenarios == {}
+
+
+def test_static_reform(crunch=b):
+    import behresp as br
+
+    # without behavioral responses the table has the values behresp returns
+    table = b.create_table(reform_dict, include_mtr=False)
+    frames = []
+    for (rows, calc_base), (_, calc) in zip(
+        b.scenario(None), b.scenario(reform_dict)
+    ):
+        _, df2br = br.response(
+            calc_base, calc, {"sub": 0, "inc": 0, "cg": 0}, dump=True
+        )
+        frames.append((rows, df2br[b.TC_VARS]))
+    expected = b.scatter(b.gather(frames), b.TC_VARS)
+    expected.columns = b.TC_LABELS
+    expected.index = range(b.rows)
+    assert table.equals(expected)
+
+
+def test_response_chunks(monkeypatch, crunch=b):
+
+    expected = b.create_table(reform_dict, be_sub=0.25)
+    # behresp runs on chunks of rows with Calculators of their own
+    monkeypatch.setattr(mcr, "RESPONSE_CHUNKSIZE", 3)
+    b_chunks = mcr.Batch(input_path)
+    assert len(list(b_chunks.response_calcs(reform_dict))) > 1
+    assert b_chunks.create_table(reform_dict, be_sub=0.25).equals(expected)
+
+    # distribution variables are read without the full behresp output
+    tc_vars = ["iitax", "payrolltax", "c00100"]
+    labels = ["Individual Income Tax", "Payroll Tax", "AGI"]
+    table = b_chunks.create_table(
+        reform_dict, tc_vars, labels, include_mtr=False, be_sub=0.25
+    )
+    assert table.equals(expected[labels])
+
+
+def test_compare(crunch=b):
+
+    reform_list = [reform_dict, reform_path]
+    comp = b.compare(reform_list)
+    assert comp["Reform"].tolist() == [0] * b.rows + [reform_path] * b.rows
+    for name, reform in [(0, reform_dict), (reform_path, reform_path)]:
+        result = comp[comp["Reform"] == name].drop(columns="Reform")
+        expected = b.create_diff_table(reform)
+        assert result.reset_index(drop=True).equals(expected)
+
+    wide = b.compare(reform_list, names=["CTC", "file"], wide=True)
+    assert list(wide.columns.levels[0]) == ["CTC", "file"]
+    assert wide["file"].equals(
+        b.create_diff_table(reform_path).set_index("ID")
+    )
+
+    comp_par = b.compare(reform_list, include_mtr=False, n_jobs=2)
+    assert comp_par.equals(b.compare(reform_list, include_mtr=False))
+    mcr.shutdown_pools()
+
+
+def test_compare_frees_reforms():
+
+    b_comp = mcr.Batch(input_path)
+    b_comp.compare([reform_dict])
+    baseline = {("current_law", None), ("current_law", "mtr")}
+    assert set(b_comp.scenarios) == baseline
+    reform_list = [{"CTC_c": {2018: amount}} for amount in (1700, 1900, 2100)]
+    b_comp.compare(reform_list, be_sub=0.25)
+    assert set(b_comp.scenarios) == baseline
+
+
+def test_mtr_options(crunch=b):
+
+    options = ["Taxpayer Earnings", "Spouse Earnings", "Long Term Gains"]
+    b_mtr = mcr.Batch(input_path, mtr_options=options)
+    table = b_mtr.create_table(reform_file=reform_dict)
+    assert len(table.columns) == len(b.TC_LABELS) + 9
+    assert "Income Tax MTR (Long Term Gains)" in table.columns
+
+    # taxpayer earnings MTRs match the default table
+    expected = b.create_table(reform_file=reform_dict)
+    assert table[expected.columns].equals(expected)
+
+    # each stacked MTR matches a Batch with only that option
+    b_cg = mcr.Batch(input_path, mtr_options="Long Term Gains")
+    cg_table = b_cg.create_table(reform_file=reform_dict)
+    cg_cols = [col for col in table.columns if "(Long Term Gains)" in col]
+    assert table[cg_cols].equals(cg_table[cg_cols])
+
+    # spouse earnings MTRs are only calculated for married filers
+    spouse = table["Combined MTR (Spouse Earnings)"]
+    married = b.invar["MARS"] == 2
+    assert spouse[~married].isna().all()
+    assert spouse[married].notna().all()
+
+    with pytest.raises(ValueError):
+        mcr.Batch(input_path, mtr_options=["Lottery Winnings"])
+
+
+def test_compact(crunch=b):
+
+    b_compact = mcr.Batch(input_path, compact=True)
+    assert b_compact.invar["FLPDYR"].dtype == np.int16
+    assert b_compact.invar["age_head"].dtype == np.int8
+    estimate = b_compact.memory_estimate(reform=True)
+    assert estimate["total"] == sum(
+        value for key, value in estimate.items() if key != "total"
+    )
+    assert estimate["calculators"] > b_compact.memory_estimate()["calculators"]
+
+    table = b_compact.create_table(reform_file=reform_dict)
+    expected = b.create_table(reform_file=reform_dict)
+    assert table["ID"].dtype == np.int8
+    assert table.memory_usage().sum() < expected.memory_usage().sum()
+    assert (table.astype(float) == expected).all().all()
+
+    diff = b_compact.create_diff_table(reform_dict)
+    expected = b.create_diff_table(reform_dict)
+    assert (diff.astype(float) == expected).all().all()
+    assert b_compact.create_table(compact=False).equals(b.create_table())
+
+
+def test_result_cache(tmpdir, monkeypatch, crunch=b):
+
+    cache = ResultCache(os.path.join(tmpdir, "results"))
+    b_cached = mcr.Batch(input_path, cache=cache)
+    table = b_cached.create_table(reform_file=reform_dict)
+    assert table.equals(b.create_table(reform_file=reform_dict))
+    assert len(cache.entries()) == 1
+
+    # a new Batch for the same inputs reads the table from the cache
+    def no_calculation(*args, **kwargs):
+        raise AssertionError("table was calculated")
+
+    monkeypatch.setattr(mcr.Batch, "scenario", no_calculation)
+    b_again = mcr.Batch(pd.read_csv(input_path, header=None), cache=cache)
+    assert b_again.create_table(reform_file=reform_dict).equals(table)
+    # different arguments or inputs are not in the cache
+    with pytest.raises(AssertionError):
+        b_again.create_table(reform_file=reform_dict, include_mtr=False)
+    ivar = pd.read_csv(input_path, header=None)
+    ivar.loc[0, 9] += 1
+    with pytest.raises(AssertionError):
+        mcr.Batch(ivar, cache=cache).create_table(reform_file=reform_dict)
+    monkeypatch.undo()
+
+    # the least recently used tables are evicted
+    b_cached.create_table(include_mtr=False)
+    cache.max_bytes = cache.size() - 1
+    oldest = cache.entries()[0][2]
+    # reading a table marks it as recently used
+    cache.get(os.path.basename(oldest)[: -len(".pkl")])
+    cache.evict()
+    assert [path for _, _, path in cache.entries()] == [oldest]
+    cache.clear()
+    assert cache.size() == 0
+
+    # tables that cannot be loaded, e.g. pickled by other package versions,
+    # are misses and are removed
+    assert {"pandas", "numpy"} <= set(mcr.versions())
+    os.makedirs(cache.path, exist_ok=True)
+    path = os.path.join(cache.path, "unloadable.pkl")
+    with open(path, "wb") as f:
+        f.write(b"cmissing_module_for_test\nTable\n.")
+    assert cache.get("unloadable") is None
+    assert not os.path.exists(path)
+
+
+def test_incremental(tmpdir, crunch=b):
+
+    cache = ResultCache(os.path.join(tmpdir, "results"))
+    ivar = pd.read_csv(input_path, header=None)
+    b_inc = mcr.Batch(ivar, cache=cache, incremental="edits")
+    b_inc.create_diff_table(reform_dict)
+    assert b_inc.metadata["incremental"]["added"] == len(ivar)
+
+    # change one row, add one and remove one
+    edited = ivar.copy()
+    edited.loc[1, 9] += 1000
+    new_row = edited.iloc[[2]].copy()
+    new_row[0] = edited[0].max() + 1
+    edited = pd.concat([edited.drop(index=4), new_row], ignore_index=True)
+    b_inc = mcr.Batch(edited, cache=cache, incremental="edits")
+    diff = b_inc.create_diff_table(reform_dict)
+    assert diff.equals(mcr.Batch(edited).create_diff_table(reform_dict))
+    assert b_inc.metadata["incremental"] == {
+        "added": 1,
+        "changed": 1,
+        "removed": 1,
+        "reused": len(ivar) - 2,
+    }
+
+    # runs with other names or input files are kept apart
+    b_other = mcr.Batch(ivar, cache=cache, incremental="other")
+    assert b_other.create_diff_table(reform_dict).equals(
+        b.create_diff_table(reform_dict)
+    )
+    assert b_other.metadata["incremental"]["reused"] == 0
+    b_file = mcr.Batch(input_path, cache=cache, incremental=True)
+    b_file.create_diff_table(reform_dict)
+    assert b_file.metadata["incremental"]["reused"] == 0
+
+    # a run on unchanged inputs reuses every row and keeps the stored run
+    b_again = mcr.Batch(edited, cache=cache, incremental="edits")
+    assert b_again.create_diff_table(reform_dict).equals(diff)
+    assert b_again.metadata["incremental"]["reused"] == len(edited)
+    # the inputs of rows that are reused are never translated
+    assert b_again._invar is None
+
+    # RECIDs are taken from the first column whatever its label
+    named = edited.copy()
+    named.columns = ["c{}".format(i) for i in range(28)]
+    b_named = mcr.Batch(named, cache=cache, incremental="edits")
+    assert b_named.create_diff_table(reform_dict).equals(diff)
+
+    with pytest.raises(ValueError):
+        mcr.Batch(input_path, incremental=True)
+    with pytest.raises(ValueError):
+        mcr.Batch(ivar, cache=cache, incremental=True)
+    duplicated = pd.concat([ivar, ivar.iloc[[0]]], ignore_index=True)
+    with pytest.raises(ValueError):
+        mcr.Batch(duplicated, cache=cache, incremental="dup").create_table()
+
+
+def test_dedup(crunch=b):
+
+    ivar = pd.read_csv(input_path, header=None)
+    copies = ivar.copy()
+    copies[0] = copies[0] + 100
+    b_dup = mcr.Batch(
+        pd.concat([ivar, copies], ignore_index=True),
+        mtr_options=["Taxpayer Earnings", "Spouse Earnings"],
+    )
+    assert b_dup.metadata["dedup"] == {
+        "rows": 2 * len(ivar),
+        "unique": len(ivar),
+        "ratio": 2.0,
+    }
+    assert len(b_dup.invar) == len(ivar)
+
+    b_single = mcr.Batch(ivar, mtr_options=b_dup.mtr_options)
+    table = b_single.create_diff_table(reform_dict)
+    table_dup = b_dup.create_diff_table(reform_dict)
+    assert table_dup.iloc[: len(ivar)].equals(table)
+    copy_rows = table_dup.iloc[len(ivar) :].reset_index(drop=True)
+    assert (copy_rows["ID"] == table["ID"] + 100).all()
+    assert copy_rows.drop(columns="ID").equals(table.drop(columns="ID"))
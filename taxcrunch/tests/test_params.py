@@ -1,5 +1,5 @@
 import pytest
-from taxcrunch.cruncher import CruncherParams
+from taxcrunch.cruncher import CruncherParams, new_params, taxsim_params
 from taxcrunch.multi_cruncher import BatchParams
 
 
@@ -22,3 +22,17 @@ def test_compare_defaults():
         bp_list.append(k)
 
     assert cp_list == bp_list
+
+
+def test_new_params():
+    """
+    Test that parameters cloned from the template are independent and that
+    the TAXSIM parameters are in input column order.
+    """
+    params = new_params(CruncherParams)
+    params.adjust({"page": [{"value": 40}]})
+    assert params.to_array("page") == 40
+    assert new_params(CruncherParams).to_array("page") == 0
+
+    bp_list = [k for k in BatchParams().dump() if k != "schema"]
+    assert list(taxsim_params()) == bp_list
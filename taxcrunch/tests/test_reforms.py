@@ -0,0 +1,150 @@
+import pytest
+import json
+import os
+import subprocess
+import sys
+from concurrent.futures import ProcessPoolExecutor
+import taxcalc as tc
+from taxcrunch import cruncher as cr
+from taxcrunch import reforms
+
+CURRENT_PATH = os.path.abspath(os.path.dirname(__file__))
+reform_path = os.path.join(CURRENT_PATH, "test_reform.json")
+input_path = os.path.join(CURRENT_PATH, "test_adjustment.json")
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    """
+    Reform store in a temporary directory that "downloads" test_reform.json
+    """
+    with open(reform_path) as f:
+        text = f.read()
+    store = reforms.ReformStore(str(tmp_path))
+    monkeypatch.setattr(store, "fetch", lambda name: store.add(name, text))
+    monkeypatch.setattr(reforms, "STORE", store)
+    return store
+
+
+def test_reform_key():
+    assert reforms.reform_key(None) == "current_law"
+    assert reforms.reform_key({"CTC_c": {2018: 1800}}) == reforms.reform_key(
+        {"CTC_c": {"2018": 1800}}
+    )
+    assert reforms.reform_key({"CTC_c": {2018: 1800}}) != reforms.reform_key(
+        {"CTC_c": {2018: 1900}}
+    )
+    with open(reform_path) as f:
+        text = f.read()
+    assert reforms.reform_key(reform_path).startswith("file:")
+    assert reforms.reform_key(text).startswith("json:")
+    with pytest.raises(TypeError):
+        reforms.reform_key(2018)
+
+
+def test_policy_cache():
+    cache = reforms.PolicyCache(maxsize=1)
+    reform = {"CTC_c": {2018: 1800}}
+    pol = cache.get(reform, 2019)
+    assert isinstance(pol, tc.Policy)
+    assert pol.current_year == 2019
+    assert pol._CTC_c[2018 - 2013] == 1800
+    # lookups return isolated copies
+    pol.implement_reform({"II_em": {2018: 500}})
+    pol2 = cache.get({"CTC_c": {"2018": 1800}}, 2019)
+    assert pol2._CTC_c[2018 - 2013] == 1800
+    assert pol2._II_em[2018 - 2013] != 500
+    assert (cache.hits, cache.misses) == (1, 1)
+    # the least recently used Policy is evicted
+    cache.get(None, 2019)
+    assert len(cache) == 1
+    cache.get(reform, 2019)
+    assert cache.misses == 3
+    cache.clear()
+    assert len(cache) == 0
+
+
+def test_reform_store(store):
+    digest = store.digest("2017_law.json")
+    assert reforms.reform_key("2017_law.json") == "preset:" + digest
+    assert store.index() == {"2017_law.json": digest}
+    assert os.path.isfile(
+        os.path.join(store.path, "objects", digest + ".json")
+    )
+    reform = store.reform("2017_law.json")
+    assert reform == tc.Policy.read_json_reform(reform_path)
+    # parsed reforms are kept in memory and handed out as copies
+    reform.clear()
+    assert store.reform("2017_law.json")
+    pol = reforms.build_policy("2017_law.json")
+    assert pol._CTC_c[2018 - 2013] == 1000
+
+
+def add_presets(path, names):
+    store = reforms.ReformStore(path)
+    for name in names:
+        store.add(name, json.dumps({"name": name}))
+
+
+def test_store_index(store, monkeypatch):
+    digest = store.digest("2017_law.json")
+    # the index is read from disk once and then kept in memory
+    reads = []
+    read_index = store._read_index
+    monkeypatch.setattr(
+        store, "_read_index", lambda: reads.append(1) or read_index()
+    )
+    for _ in range(3):
+        assert store.digest("2017_law.json") == digest
+    assert reads == []
+
+    # processes adding presets to the same store keep each other's entries
+    names = [["p{}_{}.json".format(i, j) for j in range(20)] for i in range(4)]
+    with ProcessPoolExecutor(4) as pool:
+        list(pool.map(add_presets, [store.path] * 4, names))
+    index = reforms.ReformStore(store.path).index()
+    assert set(index) == {"2017_law.json"}.union(*names)
+    assert not os.path.exists(os.path.join(store.path, "index.json.lock"))
+
+
+def test_offline_store(store, tmp_path, monkeypatch):
+    store.digest("2017_law.json")
+    offline = reforms.ReformStore(store.path, offline=True)
+    assert offline.reform("2017_law.json") == store.reform("2017_law.json")
+    with pytest.raises(reforms.ReformNotFoundError):
+        offline.reform("Trump2016.json")
+    with pytest.raises(reforms.ReformNotFoundError):
+        reforms.ReformStore(str(tmp_path / "empty"), offline=True).prewarm()
+    # a preset reform in the store can be used without network access
+    monkeypatch.setattr(reforms, "STORE", offline)
+    c = cr.Cruncher(inputs=input_path, lazy=True)
+    assert c.pol2._CTC_c[2018 - 2013] == 1000
+    with pytest.raises(reforms.ReformNotFoundError):
+        cr.Cruncher(baseline="fake_reform.json")
+
+
+def test_prewarm(store, capsys, monkeypatch):
+    monkeypatch.setattr(reforms, "ReformStore", lambda path, offline: store)
+    reforms.main(["prewarm", "--store", store.path])
+    out = capsys.readouterr().out
+    assert len(out.splitlines()) == len(reforms.preset_reforms())
+    assert set(store.index()) == set(reforms.preset_reforms())
+
+
+@pytest.mark.parametrize(
+    "value, offline",
+    [("1", True), ("yes", True), ("On", True), ("0", False), ("no", False)],
+)
+def test_offline_env(value, offline):
+    out = subprocess.run(
+        [
+            sys.executable,
+            "-c",
+            "from taxcrunch import reforms; print(reforms.OFFLINE)",
+        ],
+        check=True,
+        capture_output=True,
+        text=True,
+        env=dict(os.environ, TAXCRUNCH_OFFLINE=value),
+    )
+    assert out.stdout.strip() == str(offline)
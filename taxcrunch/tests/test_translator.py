@@ -0,0 +1,36 @@
+import os
+import pandas as pd
+from taxcrunch import translator
+from taxcrunch.cruncher import Cruncher
+
+CURRENT_PATH = os.path.abspath(os.path.dirname(__file__))
+
+
+def test_translate_cruncher_and_batch_inputs():
+    """
+    Test that Cruncher-style (Single/Joint, True/False) and Batch-style
+    (1/2, 0/1) inputs translate to the same Tax-Calculator variables.
+    """
+    adjustment = os.path.join(CURRENT_PATH, "test_adjustment.json")
+    c = Cruncher(inputs=adjustment, lazy=True)
+    ivar = c.ivar.copy()
+    batch_ivar = translator.batch_inputs(ivar)
+    # batch_inputs leaves its argument alone
+    assert ivar.equals(c.ivar)
+    assert batch_ivar.loc[0, 2] in (1, 2)
+
+    invar = translator.translate(ivar)
+    invar_batch = translator.translate(batch_ivar)
+    assert list(invar.columns) == list(invar_batch.columns)
+    assert invar.astype(float).equals(invar_batch.astype(float))
+    assert c.translate(ivar).equals(invar)
+
+
+def test_translate_batch_file():
+    ivar = pd.read_csv(
+        os.path.join(CURRENT_PATH, "example_test_input.csv"), header=None
+    )
+    invar = translator.translate(ivar)
+    assert len(invar.index) == len(ivar.index)
+    assert invar["MARS"].tolist() == [4, 2, 1, 2, 2, 1, 4]
+    assert (invar["e00200"] == ivar[9] + ivar[10]).all()
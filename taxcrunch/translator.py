@@ -0,0 +1,119 @@
+"""
+Stateless translation of TAXSIM-27 style inputs into Tax-Calculator input
+variables, shared by Cruncher (one household) and Batch (many households).
+Inputs are Pandas dataframes with the 28 TAXSIM-style columns labeled 0-27.
+"""
+
+import numpy as np
+import pandas as pd
+
+# TAXSIM-27 input column and Tax-Calculator variable that are increased to
+# calculate marginal tax rates for each 'mtr_options' choice
+MTR_OPTIONS = {
+    "Taxpayer Earnings": (9, "e00200p"),
+    "Spouse Earnings": (10, "e00200s"),
+    "Qualified Dividends": (11, "e00650"),
+    "Interest Received": (12, "e00300"),
+    "Short Term Gains": (13, "p22250"),
+    "Long Term Gains": (14, "p23250"),
+    "Business Income": (15, "e26270"),
+    "Pensions": (21, "e01700"),
+    "Gross Social Security Benefits": (22, "e02400"),
+    "Real Estate Taxes Paid": (24, "e18500"),
+    "Mortgage": (27, "e19200"),
+}
+
+
+def batch_inputs(ivar):
+    """
+    Translates string parameters to integers for Batch processing.
+
+    Returns:
+        batch_ivar: a copy of ivar with mstat as 1/2 and sstb as 0/1
+    """
+    batch_ivar = ivar.copy()
+    # convert mstat to int
+    mstat = ivar.loc[:, 2]
+    # Single -> 1; Joint -> 2
+    batch_ivar.loc[:, 2] = np.where(mstat == "Single", 1, 2)
+    # convert sstb to int
+    sstb = ivar.loc[:, 16]
+    # True -> 1; False -> 0
+    batch_ivar.loc[:, 16] = np.where(sstb, 1, 0)
+    return batch_ivar
+
+
+def translate(ivar):
+    """
+    Translate TAXSIM-27 input variables into Tax-Calculator input variables.
+        Every variable is computed for all rows at once and the dataframe is
+        built in one step.
+
+    Returns:
+        invar: a Pandas dataframe with Tax-Calculator variables
+    """
+    invar = {}
+    invar["RECID"] = ivar.loc[:, 0]
+    invar["FLPDYR"] = ivar.loc[:, 1]
+    # no Tax-Calculator use of TAXSIM variable 3, state code
+    mstat = ivar.loc[:, 2]
+    invar["age_head"] = ivar.loc[:, 3]
+    invar["age_spouse"] = ivar.loc[:, 4]
+
+    nu13 = ivar.loc[:, 5]
+    invar["f2441"] = nu13
+    n1316 = ivar.loc[:, 6]
+    invar["n24"] = nu13 + n1316
+    n1719 = ivar.loc[:, 7]
+    num_eitc_qualified_kids = nu13 + n1316 + n1719
+
+    invar["EIC"] = np.minimum(num_eitc_qualified_kids, 3)
+    other_dep = ivar.loc[:, 8]
+    num_deps = num_eitc_qualified_kids + other_dep
+    # convert both Cruncher and Batch inputs (i.e. Single/Joint
+    # and 0/1)
+    mars = np.where(
+        np.logical_or(mstat.astype(str) == "Single", mstat == 1),
+        np.where(num_deps > 0, 4, 1),
+        2,
+    )
+    invar["MARS"] = mars
+    assert np.all(
+        np.logical_or(mars == 1, np.logical_or(mars == 2, mars == 4))
+    )
+    num_taxpayers = np.where(mars == 2, 2, 1)
+    invar["XTOT"] = num_taxpayers + num_deps
+    invar["e00200p"] = ivar.loc[:, 9]
+    invar["e00200s"] = ivar.loc[:, 10]
+    invar["e00200"] = invar["e00200p"] + invar["e00200s"]
+    invar["e00650"] = ivar.loc[:, 11]
+    invar["e00600"] = invar["e00650"]
+    invar["e00300"] = ivar.loc[:, 12]
+    invar["p22250"] = ivar.loc[:, 13]
+    invar["p23250"] = ivar.loc[:, 14]
+    invar["e26270"] = ivar.loc[:, 15]
+    sstb_bool = ivar.loc[:, 16]
+    # convert both Cruncher and Batch inputs (i.e. True/False and 0/1
+    invar["PT_SSTB_income"] = np.where(
+        np.logical_or(sstb_bool, sstb_bool == 1), 1, 0
+    )
+    invar["PT_binc_w2_wages"] = ivar.loc[:, 17]
+    invar["PT_ubia_property"] = ivar.loc[:, 18]
+
+    e02000 = ivar.loc[:, 19]
+    invar["e00800"] = ivar.loc[:, 20]
+    invar["e01700"] = ivar.loc[:, 21]
+    invar["e01500"] = invar["e01700"]
+    invar["e02400"] = ivar.loc[:, 22]
+    invar["e02300"] = ivar.loc[:, 23]
+    # no Tax-Calculator use of TAXSIM variable 22, non-taxable transfers
+    # no Tax-Calculator use of TAXSIM variable 23, rent paid
+    invar["e18500"] = ivar.loc[:, 24]
+    invar["e18400"] = ivar.loc[:, 25]
+    invar["e32800"] = ivar.loc[:, 26]
+    invar["e19200"] = ivar.loc[:, 27]
+
+    # e26270 is included in e02000
+    invar["e02000"] = invar["e26270"] + e02000
+
+    return pd.DataFrame(invar)